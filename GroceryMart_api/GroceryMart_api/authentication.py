@@ -0,0 +1,88 @@
+"""
+JWT authentication that loads the request's context with the user.
+
+The user is read together with its profile, cart and wishlist in one joined query, so
+views reach request.user.profile, Cart.objects.for_user() and Wishlist.objects.for_user()
+without further queries. A user that has no cart or wishlist yet gets one created on
+first use.
+
+The loaded user is then kept in the AUTH_USER_CACHE, keyed by the token's user id, e.g.
+{"BACKEND": "GroceryMart_api.cache_backends.LocMemLRUBackend", "OPTIONS": {"timeout": 30, "max_entries": 10000}},
+so most authenticated requests skip the query. Saving or deleting the user, its profile,
+cart or wishlist drops the entry ( accounts/signals.py ), in this process only with the
+default per-process LRU: another process serves its copy until the timeout, which is why
+it is short by default. A deactivated user or a changed password thus locks out every
+process within 30 seconds; with a SharedCacheBackend the entry is dropped everywhere at
+once and the timeout can be longer. Changes made with queryset.update() send no signals
+and show up after the timeout at the latest, so code that must see current values, like
+the balance payment, reads them from the database.
+"""
+import pickle
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# reverse one-to-one relations of the user, a missing row is simply cached as missing
+REQUEST_CONTEXT = ("profile", "cart", "wishlist")
+
+_user_cache = None
+
+
+def get_user_cache():
+    global _user_cache
+    if _user_cache is None:
+        config = getattr(settings, "AUTH_USER_CACHE", {})
+        backend_class = import_string(config.get("BACKEND", "GroceryMart_api.cache_backends.LocMemLRUBackend"))
+        _user_cache = backend_class(**{"timeout": 30, "max_entries": 10000, **config.get("OPTIONS", {})})
+    return _user_cache
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def forget_user(user_id):
+    """Drops the cached user, now and again when the transaction commits."""
+    key = user_cache_key(user_id)
+    get_user_cache().delete(key)
+    # a request running before the commit could cache the old rows again
+    transaction.on_commit(lambda: get_user_cache().delete(key))
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user_cache = get_user_cache()
+        key = user_cache_key(user_id)
+        cached = user_cache.get(key)
+        if cached is not None:
+            # every request gets its own copy, views may change the user and its relations
+            user = pickle.loads(cached)
+        else:
+            try:
+                user = self.user_model.objects.select_related(*REQUEST_CONTEXT).get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(key, pickle.dumps(user))
+
+        # the checks of rest_framework_simplejwt.authentication.JWTAuthentication.get_user
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
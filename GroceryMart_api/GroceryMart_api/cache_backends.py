@@ -0,0 +1,102 @@
+"""
+Small key-value cache backends, used for the catalog responses ( product/cache.py ) and
+the authenticated users ( GroceryMart_api/authentication.py ).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+
+class ResponseCacheBackend:
+    """Base class for the cache backends, counts hits and misses."""
+    def __init__(self, timeout=60, **options):
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._set(key, value)
+
+    def delete(self, key):
+        self._delete(key)
+
+    def stats(self):
+        return {"backend": type(self).__name__, "hits": self.hits, "misses": self.misses}
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        self.hits = self.misses = 0
+
+
+class LocMemLRUBackend(ResponseCacheBackend):
+    """Per-process LRU for single-node deployments, entries expire after `timeout` seconds."""
+    def __init__(self, timeout=60, max_entries=1000, **options):
+        super().__init__(timeout)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        return {**super().stats(), "entries": len(self._entries), "max_entries": self.max_entries}
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedCacheBackend(ResponseCacheBackend):
+    """Stores entries in a Django cache (e.g. Redis or Memcached) shared by every node."""
+    def __init__(self, timeout=60, alias="default", **options):
+        super().__init__(timeout)
+        self.alias = alias
+
+    def _get(self, key):
+        return caches[self.alias].get(key)
+
+    def _set(self, key, value):
+        caches[self.alias].set(key, value, self.timeout)
+
+    def _delete(self, key):
+        caches[self.alias].delete(key)
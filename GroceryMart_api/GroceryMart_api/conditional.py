@@ -0,0 +1,65 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class NotModified(Exception):
+    """Raised from initial() to answer a conditional request before the handler runs."""
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Weak ETag and Last-Modified support for GET endpoints.
+
+    Views implement get_conditional_state() and return (parts, last_modified) built from
+    cheap metadata such as timestamps and counters, or None to skip the check. The parts
+    must come from the database ( columns, or stored versions like catalog_version() ),
+    so every process behind the load balancer issues the same ETag. The ETag
+    hashes the parts with the query string and the response format. A request whose
+    If-None-Match (or If-Modified-Since) still matches gets a 304 straight after
+    authentication, so the view's queries and serializer never run.
+    """
+    def get_conditional_state(self, request, *args, **kwargs):
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional_headers = {}
+        if request.method not in ("GET", "HEAD"):
+            return
+        state = self.get_conditional_state(request, *args, **kwargs)
+        if state is None:
+            return
+
+        parts, last_modified = state
+        raw = repr((parts, sorted(request.query_params.lists()), request.accepted_renderer.format))
+        etag = f'W/"{hashlib.md5(raw.encode()).hexdigest()}"'
+        self.conditional_headers["ETag"] = etag
+        timestamp = None
+        if last_modified is not None:
+            timestamp = int(last_modified.timestamp())
+            self.conditional_headers["Last-Modified"] = http_date(timestamp)
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code in (200, 304):
+            for header, value in getattr(self, "conditional_headers", {}).items():
+                response[header] = value
+        return response
+
+
+def latest(*timestamps):
+    """Most recent of the given timestamps, ignoring None."""
+    return max(filter(None, timestamps), default=None)
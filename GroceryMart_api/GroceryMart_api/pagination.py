@@ -0,0 +1,144 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+UNSUPPORTED_ORDERING = "Cursor pagination is not available for this ordering, use ?page= instead."
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination (the default, kept for existing clients) with an opt-in keyset mode.
+
+    Passing ?cursor= (empty for the first page) switches to keyset pagination: the cursor
+    holds the ordering values of the last row, e.g. (created_at, id), and the next page is
+    read with a "(created_at, id) < (x, y)" condition on the indexed columns. Every page
+    then costs the same at any depth, and no COUNT(*) is issued.
+    """
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = [self.flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        try:
+            rows = list(queryset[: self.page_size + 1])
+        except DjangoValidationError:  # cursor values that do not fit the fields
+            raise NotFound(self.invalid_cursor_message)
+
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.rows = rows
+        return rows
+
+    def get_ordering(self, queryset):
+        """Ordering fields of the queryset with a primary key tiebreaker appended."""
+        if queryset.query.extra_order_by:
+            raise ValidationError({"cursor": UNSUPPORTED_ORDERING})
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or ["-pk"])
+        fields = [field.lstrip("-") for field in ordering]
+        if not all(isinstance(field, str) and "__" not in field for field in fields):
+            raise ValidationError({"cursor": UNSUPPORTED_ORDERING})
+        if "pk" not in fields and "id" not in fields:
+            ordering.append("-pk" if ordering[0].startswith("-") else "pk")
+        return ordering
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def after(ordering, position):
+        """Rows strictly after `position` in `ordering`: (a > x) OR (a = x AND b > y) OR ..."""
+        condition = Q()
+        for i, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            term = Q(**{f"{name}__{lookup}": position[i]})
+            for previous, value in zip(ordering[:i], position):
+                term &= Q(**{previous.lstrip("-"): value})
+            condition |= term
+        return condition
+
+    def position_of(self, row):
+        values = []
+        for field in self.ordering:
+            value = getattr(row, field.lstrip("-"))
+            if value is None:
+                raise ValidationError({"cursor": UNSUPPORTED_ORDERING})
+            values.append(value if isinstance(value, (int, float)) else str(value))
+        return values
+
+    def encode_cursor(self, row, reverse):
+        payload = json.dumps({"p": self.position_of(row), "r": reverse}, separators=(",", ":"))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+            position, reverse = payload["p"], bool(payload["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            "name": self.cursor_query_param,
+            "required": False,
+            "in": "query",
+            "description": "Keyset pagination cursor, pass it empty for the first page. Responses then have next/previous cursors instead of count/page.",
+            "schema": {"type": "string"},
+        })
+        return parameters
@@ -0,0 +1,83 @@
+from django.utils.module_loading import import_string
+
+
+def parse_fields(value):
+    """Turns "id,items.product.name" into {"id": None, "items": {"product": {"name": None}}}."""
+    tree = {}
+    for path in filter(None, (part.strip() for part in value.split(","))):
+        node = tree
+        *parents, leaf = path.split(".")
+        for name in parents:
+            child = node.get(name, {})
+            if child is None:  # the whole field is already requested
+                break
+            node[name] = child
+            node = child
+        else:
+            node[leaf] = None
+    return tree
+
+
+def query_params(request):
+    return getattr(request, "query_params", None) or {}
+
+
+def requested_fields(request):
+    """Parsed ?fields= of the request, None when the client did not restrict the fields."""
+    value = query_params(request).get("fields")
+    return parse_fields(value) if value else None
+
+
+def expanded_fields(request):
+    value = query_params(request).get("expand", "")
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def field_requested(request, name):
+    """Whether a top-level field will be in the response, so views can skip the queries behind it."""
+    fields = requested_fields(request)
+    return fields is None or name in fields
+
+
+class DynamicFieldsMixin:
+    """
+    Lets clients trim and expand the representation with query parameters.
+
+    ?fields=id,name,items.product.price keeps only the listed fields, dotted paths reach
+    into nested serializers and a bare nested name keeps all of its fields.
+    ?expand=product replaces a compact nested field listed in `expandable_fields` with its
+    full serializer, at any depth.
+    Fields are dropped before serialization, so they cost nothing.
+    """
+    # {"field name": (serializer class or dotted path, kwargs)}
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None:
+            return fields
+
+        for name in expanded_fields(request) & set(self.expandable_fields):
+            serializer_class, kwargs = self.expandable_fields[name]
+            if isinstance(serializer_class, str):
+                serializer_class = import_string(serializer_class)
+            fields[name] = serializer_class(**kwargs)
+
+        spec = requested_fields(request)
+        for name in self.field_path():
+            if spec is None:
+                break
+            spec = spec.get(name)
+        if spec is not None:
+            fields = {name: field for name, field in fields.items() if name in spec}
+        return fields
+
+    def field_path(self):
+        """Names of the fields leading from the root serializer to this one."""
+        path, node = [], self
+        while node.parent is not None:
+            if node.field_name:  # the child of a many=True list has no name of its own
+                path.append(node.field_name)
+            node = node.parent
+        return path[::-1]
@@ -56,6 +56,7 @@ INSTALLED_APPS = [
     "wishlist",
     "orders",
     "payments",
+    "outbox",
 ]
 
 MIDDLEWARE = [
@@ -105,6 +106,9 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # take the write lock when the transaction starts, concurrent checkouts then wait
+            # for each other instead of failing with "database is locked"
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
         }
     }
 
@@ -171,7 +175,9 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# emails are queued in the outbox and sent by manage.py run_worker, see outbox/mail.py
+EMAIL_BACKEND = "outbox.mail.QueuedEmailBackend"
+OUTBOX_EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -194,7 +200,7 @@ STRIPE_CURRENCY = "usd"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "GroceryMart_api.authentication.JWTAuthentication",  # loads profile, cart and wishlist with the user
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,  # products per page
@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from cart.models import Cart
+from wishlist.models import Wishlist
+from GroceryMart_api.authentication import forget_user
+from .models import Profile
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """Covers is_active, password and every other user change, see GroceryMart_api/authentication.py."""
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def forget_cached_profile(sender, instance, **kwargs):
+    """The profile is cached with the user."""
+    forget_user(instance.user_id)
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def forget_cached_cart_or_wishlist(sender, instance, created=True, **kwargs):
+    """Only the existence and id of the cart and wishlist matter, not their stamp updates."""
+    if created:  # post_delete sends no `created`
+        forget_user(instance.user_id)
@@ -0,0 +1,72 @@
+"""
+Bulk cart changes, shared by POST /cart/bulk/ and the wishlist's move to cart.
+"""
+from .models import CartItem
+from .reservations import CartHolds
+
+MAX_OPERATIONS = 200  # per call, of /cart/bulk/ and the wishlist's move to cart
+
+
+def apply_operations(cart, operations):
+    """
+    Applies {product_id, quantity, op} operations ( op is add, set or remove ) to the cart
+    and returns one {product_id, op, status, quantity, error} result per operation. Stock
+    is validated for all lines with one product query, lines that fail are skipped, their
+    holds left as they are, and the others written with one bulk query per kind of change. Use inside transaction.atomic().
+    """
+    product_ids = {operation["product_id"] for operation in operations}
+    holds = CartHolds(cart, product_ids)  # products and this cart's holds, one query each
+    products = holds.products
+    items = {item.product_id: item for item in cart.items.filter(product_id__in=product_ids)}
+
+    # apply the operations in order to the quantities in memory, 0 means not in the cart
+    quantities = {product_id: item.quantity for product_id, item in items.items()}
+    checked = set()  # lines with a successful operation, their quantity is within the stock
+    results = []
+    for operation in operations:
+        product_id, op = operation["product_id"], operation["op"]
+        product = products.get(product_id)
+        current = quantities.get(product_id, 0)
+        error = None
+        if product is None:
+            error = "Product not found"
+        elif op == "remove":
+            if not current:
+                error = "Item not in cart"
+            new_quantity = 0
+        else:
+            new_quantity = current + operation["quantity"] if op == "add" else operation["quantity"]
+            if new_quantity > holds.available(product_id):
+                error = f"Only {holds.available(product_id)} units of {product.name} available"
+
+        if error:
+            results.append({
+                "product_id": product_id, "op": op, "status": "error", "quantity": current, "error": error,
+            })
+        else:
+            quantities[product_id] = new_quantity
+            checked.add(product_id)
+            results.append({"product_id": product_id, "op": op, "status": "ok", "quantity": new_quantity})
+
+    to_create, to_update, to_delete = [], [], []
+    for product_id, quantity in quantities.items():
+        if product_id in checked:
+            holds.set(product_id, quantity)  # also renews the hold of an unchanged quantity
+        item = items.get(product_id)
+        if item is None:
+            if quantity:
+                to_create.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+        elif not quantity:
+            to_delete.append(item.pk)
+        elif quantity != item.quantity:
+            item.quantity = quantity
+            to_update.append(item)
+
+    CartItem.objects.bulk_create(to_create)
+    CartItem.objects.bulk_update(to_update, ["quantity"])
+    if to_delete:
+        CartItem.objects.filter(pk__in=to_delete).delete()
+    if (to_create or to_update) and not to_delete:
+        cart.save(update_fields=["updated_at"])  # bulk_create/bulk_update send no signals, deletes do
+    holds.save()
+    return results
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from cart.reservations import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Give the stock of expired cart reservations back, once or every --interval seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0, help="Keep sweeping every N seconds (0 runs once)")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                released = release_expired_holds(batch_size=options["batch_size"])
+            except DatabaseError as e:
+                if not options["interval"]:
+                    raise
+                # e.g. a lock timeout, the next sweep releases what this one missed
+                self.stderr.write(f"Sweep failed: {e}")
+                released = 0
+            if released or not options["interval"]:
+                self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds"))
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
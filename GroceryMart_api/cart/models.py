@@ -1,17 +1,93 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Count, F, Prefetch, Sum, Value, prefetch_related_objects
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils.functional import cached_property
 from product.models import Product
 
 
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def fresh_copy(instance, **related):
+    """A new instance with the field values of `instance`, without its prefetch or property caches."""
+    opts = instance._meta
+    return opts.model(**{field.attname: getattr(instance, field.attname) for field in opts.concrete_fields}, **related)
+
+
+def items_with_products():
+    return Prefetch("items", queryset=CartItem.objects.select_related("product"))
+
+
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        """Prefetches the items with their products, so totals and checkout loops run no further queries."""
+        return self.prefetch_related(items_with_products())
+
+    def for_user(self, user):
+        """
+        The user's cart, created on first use. Runs no query when the authentication loaded
+        it with the user, see GroceryMart_api/authentication.py. Every call returns a fresh
+        instance, so prefetched items or totals never outlive the caller.
+        """
+        try:
+            cart = user.cart
+        except Cart.DoesNotExist:
+            cart, _ = self.get_or_create(user=user)
+            user.cart = cart
+        return fresh_copy(cart, user=user)
+
+
 class Cart(models.Model):
     """Shopping cart model for a user."""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="cart")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # touched whenever an item changes, see cart/signals.py
+
+    objects = CartQuerySet.as_manager()
 
     @property
     def total(self):
-        return sum(item.product.price * item.quantity for item in self.items.all())
+        return self.totals["total"]
 
+    @property
+    def item_count(self):
+        """Number of distinct products in the cart."""
+        return self.totals["item_count"]
+
+    @cached_property
+    def totals(self):
+        """
+        Total price, item count and quantity, computed once per instance and then reused
+        by the serializer, checkout and the payment gateways. Uses the prefetched items
+        when they are loaded, otherwise a single aggregate query.
+        """
+        items = getattr(self, "_prefetched_objects_cache", {}).get("items")
+        if items is not None:
+            return {
+                "total": sum((item.product.price * item.quantity for item in items), Decimal("0.00")),
+                "item_count": len(items),
+                "quantity": sum(item.quantity for item in items),
+            }
+        return self.items.aggregate(
+            total=Coalesce(
+                Sum(F("quantity") * F("product__price"), output_field=MONEY), Value(Decimal("0.00")), output_field=MONEY
+            ),
+            item_count=Count("id"),
+            quantity=Coalesce(Sum("quantity"), 0),
+        )
+
+    def load_items(self):
+        """with_items() for a cart that is already loaded, e.g. Cart.objects.for_user()."""
+        prefetch_related_objects([self], items_with_products())
+        self.refresh_totals()
+        return self
+
+    def refresh_totals(self):
+        """Drops the memoized totals after the items changed."""
+        self.__dict__.pop("totals", None)
 
     def __str__(self):
         return f"{self.user.username}'s Cart"
@@ -27,4 +103,22 @@ class CartItem(models.Model):
         unique_together = ['cart', 'product']
 
     def __str__(self):
-        return f"{self.quantity} X {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} X {self.product.name}"
+
+
+class StockReservation(models.Model):
+    """Stock held for a cart line until `expires_at`, counted in Product.reserved."""
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="reservations")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['cart', 'product']
+        indexes = [
+            # the sweeper looks for expired holds
+            models.Index(fields=["expires_at"], name="reservation_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} X {self.product.name} held for {self.cart}"
\ No newline at end of file
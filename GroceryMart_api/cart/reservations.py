@@ -0,0 +1,174 @@
+"""
+Cart stock reservations.
+
+Putting a product in the cart holds that quantity for CART_RESERVATION_TTL seconds
+( 15 minutes by default ). Holds are rows of StockReservation and are also summed up
+in Product.reserved, so the available-to-promise quantity is simply stock - reserved.
+Expired holds are given back by release_expired_holds(), which the outbox worker runs every
+CART_RESERVATION_SWEEP_INTERVAL seconds ( cart/tasks.py ) or manage.py release_expired_holds,
+and checkout turns the cart's holds into stock decrements with commit_holds().
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from product.inventory import InsufficientStock, take_stock
+from product.models import Product
+from .models import StockReservation
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, "CART_RESERVATION_TTL", 15 * 60))
+
+
+def reserved_delta(deltas):
+    """F("reserved") changed by a per-product amount, for a single UPDATE over all products."""
+    return F("reserved") + Case(
+        *[When(pk=product_id, then=Value(delta)) for product_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+class CartHolds:
+    """
+    The stock holds of one cart for a set of products.
+
+    Loads the products and the cart's holds with one query each, both locked for the
+    transaction ( products in id order, so concurrent carts cannot deadlock ). Changed
+    holds are written with one UPDATE of Product.reserved and one upsert of the
+    reservation rows, which also renews their expiry. Use inside transaction.atomic().
+    """
+    def __init__(self, cart, product_ids):
+        self.cart = cart
+        product_ids = set(product_ids)
+        self.products = Product.objects.select_for_update().order_by("pk").in_bulk(product_ids)
+        self.held = dict(
+            StockReservation.objects.select_for_update()
+            .filter(cart=cart, product_id__in=product_ids)
+            .values_list("product_id", "quantity")
+        )
+        self.targets = {}
+
+    def available(self, product_id):
+        """Quantity this cart can have: the free stock plus what the cart already holds."""
+        product = self.products[product_id]
+        return product.stock - product.reserved + self.held.get(product_id, 0)
+
+    def check(self, product_id, quantity):
+        if quantity > self.available(product_id):
+            raise InsufficientStock(self.products[product_id], self.available(product_id))
+
+    def set(self, product_id, quantity):
+        """Holds `quantity` of the product for the cart, 0 releases the hold."""
+        self.targets[product_id] = quantity
+
+    def save(self):
+        now = timezone.now()
+        deltas = {
+            product_id: quantity - self.held.get(product_id, 0)
+            for product_id, quantity in self.targets.items()
+            if quantity != self.held.get(product_id, 0)
+        }
+        if deltas:
+            Product.objects.filter(pk__in=deltas).update(reserved=reserved_delta(deltas), updated_at=now)
+
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(cart=self.cart, product_id=product_id, quantity=quantity, expires_at=now + reservation_ttl())
+                for product_id, quantity in self.targets.items() if quantity
+            ],
+            update_conflicts=True,
+            unique_fields=["cart", "product"],
+            update_fields=["quantity", "expires_at"],
+        )
+        released = [product_id for product_id, quantity in self.targets.items() if not quantity and product_id in self.held]
+        if released:
+            StockReservation.objects.filter(cart=self.cart, product_id__in=released).delete()
+
+        self.held.update(self.targets)
+        self.targets = {}
+
+
+def commit_holds(cart, quantities):
+    """
+    Turns the cart's holds into stock decrements at checkout.
+
+    `quantities` is {product_id: quantity} of the order. The holds are released and the
+    quantities taken off the stock with product.inventory.take_stock(), a part that is not
+    held ( the hold expired or was never taken ) must be covered by free stock. Raises
+    InsufficientStock and rolls back when a product falls short.
+    """
+    _commit(StockReservation.objects.filter(cart=cart), quantities)
+
+
+def commit_user_holds(user_id, quantities):
+    """
+    commit_holds() for an order paid through a payment gateway, by the user's id so the
+    cart is not loaded. Only the holds of the order's products are taken, anything the
+    customer added to the cart since the payment started keeps its hold.
+    """
+    _commit(StockReservation.objects.filter(cart__user_id=user_id, product_id__in=quantities), quantities)
+
+
+def _commit(reservations, quantities):
+    with transaction.atomic():
+        held = dict(reservations.select_for_update(of=("self",)).values_list("product_id", "quantity"))
+        if held:
+            reservations.delete()
+        take_stock(quantities, held)  # last, so hot product rows stay locked only until the commit
+
+
+def release_holds(cart):
+    """Gives back every hold of the cart, e.g. before the cart is deleted."""
+    with transaction.atomic():
+        # products first, like CartHolds
+        product_ids = StockReservation.objects.filter(cart=cart).values_list("product_id", flat=True)
+        list(Product.objects.select_for_update().filter(pk__in=list(product_ids)).order_by("pk").values_list("pk"))
+        held = dict(
+            StockReservation.objects.select_for_update().filter(cart=cart).values_list("product_id", "quantity")
+        )
+        if held:
+            Product.objects.filter(pk__in=held).update(
+                reserved=reserved_delta({product_id: -quantity for product_id, quantity in held.items()}),
+                updated_at=timezone.now(),
+            )
+            StockReservation.objects.filter(cart=cart).delete()
+
+
+def release_expired_holds(batch_size=500):
+    """
+    Gives expired holds back to the free stock in batches, returns how many were released.
+
+    Locks the products first, in id order, then their holds, the order CartHolds locks
+    them in, so a sweep cannot deadlock with a cart renewing a hold. Products and holds
+    locked by a cart or a checkout are skipped, the next sweep releases them.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            product_ids = set(
+                StockReservation.objects.filter(expires_at__lte=now).values_list("product_id", flat=True)[:batch_size]
+            )
+            locked = list(
+                Product.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=product_ids).order_by("pk").values_list("pk", flat=True)
+            )
+            expired = list(
+                StockReservation.objects.select_for_update(skip_locked=True)  # holds being checked out are skipped
+                .filter(product_id__in=locked, expires_at__lte=now)
+                .values_list("id", "product_id", "quantity")[:batch_size]
+            )
+            if not expired:
+                return released
+            totals = defaultdict(int)
+            for _, product_id, quantity in expired:
+                totals[product_id] -= quantity
+            Product.objects.filter(pk__in=totals).update(reserved=reserved_delta(totals), updated_at=now)
+            StockReservation.objects.filter(id__in=[reservation_id for reservation_id, _, _ in expired]).delete()
+        released += len(expired)
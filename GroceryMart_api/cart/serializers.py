@@ -1,18 +1,22 @@
 from rest_framework import serializers
 from .models import Cart, CartItem
 from product.models import Product
-from product.serializers import ProductSerializer
+from product.serializers import ProductCardSerializer, ProductSerializer
+from GroceryMart_api.serializers import DynamicFieldsMixin
+
+from drf_spectacular.utils import extend_schema_field
 
 
 """
-product field is for Get requests to show the full product Details 
+product field is for Get requests to show the product card ( ?expand=product for the full product Details )
 and product_id is for Post requests to take only the product id as input 
 """
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for cart items, including product details."""
-    product = ProductSerializer(read_only=True)
+    product = ProductCardSerializer(read_only=True)
+    expandable_fields = {"product": (ProductSerializer, {"read_only": True})}
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source="product", write_only=True
     )
@@ -22,6 +26,24 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product", "product_id", "quantity"]
 
 
+"""
+CartBulkOperationSerializer is one line of a /cart/bulk/ request:
+add increments the quantity, set replaces it ( 0 removes the item ) and remove deletes the item
+"""
+
+
+class CartBulkOperationSerializer(serializers.Serializer):
+    """A single operation of a bulk cart update."""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, default=1)
+    op = serializers.ChoiceField(choices=["add", "set", "remove"], default="add")
+
+    def validate(self, data):
+        if data["op"] == "add" and data["quantity"] < 1:
+            raise serializers.ValidationError("Quantity to add must be at least 1.")
+        return data
+
+
 """
 CartItemQuantitySerializer is used to update Item Quantity in a Cart  
 """
@@ -36,10 +58,7 @@ class CartItemQuantitySerializer(serializers.ModelSerializer):
     def validate_quantity(self, value):
         if value < 0:
             raise serializers.ValidationError("Quantity cannot be negative.")
-
-        if value > self.instance.product.stock:
-            raise serializers.ValidationError("Not enough stock available.")
-        
+        # the stock is checked by the view against the available-to-promise, see CartHolds.check()
         return value
 
 
@@ -48,15 +67,18 @@ the items field is to show all the item the cart is containing.
 """
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for the entire cart, including items and total."""
     items = CartItemSerializer(many=True, read_only=True)
     total = serializers.SerializerMethodField()
 
+    item_count = serializers.IntegerField(read_only=True)
+
+    @extend_schema_field(serializers.DecimalField(max_digits=12, decimal_places=2))
     def get_total(self, obj):
         return obj.total
 
     class Meta:
         model = Cart
-        fields = ["id", "user", "created_at", "items", "total"]
+        fields = ["id", "user", "created_at", "items", "total", "item_count"]
         read_only_fields = ["user", "total"]
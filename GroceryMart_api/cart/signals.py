@@ -0,0 +1,26 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Cart, CartItem
+from .reservations import release_holds
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def touch_cart(sender, instance, origin=None, **kwargs):
+    """Moves the cart's modification stamp, which the cart ETag is built from."""
+    if isinstance(origin, QuerySet):
+        # a queryset delete sends one signal per item, touch each cart only once
+        touched = origin.__dict__.setdefault("_touched_carts", set())
+        if instance.cart_id in touched:
+            return
+        touched.add(instance.cart_id)
+    Cart.objects.filter(pk=instance.cart_id).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_holds(sender, instance, **kwargs):
+    """The cascade would drop the reservation rows without giving their stock back."""
+    release_holds(instance)
@@ -0,0 +1,10 @@
+from django.conf import settings
+
+from outbox.queue import periodic
+from .reservations import release_expired_holds
+
+
+@periodic(every=getattr(settings, "CART_RESERVATION_SWEEP_INTERVAL", 60))
+def release_expired_cart_holds():
+    """Gives the stock of abandoned carts back, see cart/reservations.py."""
+    release_expired_holds()
@@ -1,3 +1,202 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Cart, CartItem, StockReservation
+from .reservations import release_expired_holds
+from accounts.models import Profile
+from product.models import Brand, Product
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer")
+        self.cart = Cart.objects.create(user=self.user)
+        brand = Brand.objects.create(name="Test Brand")
+        for i, (price, quantity) in enumerate([("10.50", 2), ("3.25", 4), ("1.99", 1)]):
+            product = Product.objects.create(name=f"Product {i}", price=price, stock=10, brand=brand)
+            CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+
+    def test_totals_take_one_aggregate_query(self):
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.total, Decimal("35.99"))
+            self.assertEqual(cart.item_count, 3)
+            self.assertEqual(cart.totals["quantity"], 7)
+
+    def test_prefetched_items_need_no_query(self):
+        cart = Cart.objects.with_items().get(pk=self.cart.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.total, Decimal("35.99"))
+            self.assertEqual(cart.item_count, 3)
+
+    def test_empty_cart_and_refresh(self):
+        cart = Cart.objects.get(pk=self.cart.pk)
+        self.assertEqual(cart.total, Decimal("35.99"))
+        cart.items.all().delete()
+        cart.refresh_totals()
+        self.assertEqual(cart.total, Decimal("0.00"))
+        self.assertEqual(cart.item_count, 0)
+
+    def test_cart_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get("/cart/")
+        self.assertEqual(Decimal(str(response.data["total"])), Decimal("35.99"))
+        self.assertEqual(response.data["item_count"], 3)
+
+
+class CartBulkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        brand = Brand.objects.create(name="Test Brand")
+        self.products = [
+            Product.objects.create(name=f"Product {i}", price=2, stock=5, brand=brand) for i in range(40)
+        ]
+
+    def bulk(self, operations):
+        response = self.client.post("/cart/bulk/", operations, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_query_count_does_not_grow_with_lines(self):
+        self.bulk([{"product_id": self.products[0].id}])
+        with self.assertNumQueries(10):  # the cart came with the user on the first request
+            results = self.bulk([{"product_id": p.id, "quantity": 2} for p in self.products[:20]])
+        self.assertTrue(all(r["status"] == "ok" for r in results))
+        operations = (
+            [{"product_id": p.id, "op": "set", "quantity": 3} for p in self.products[:10]]
+            + [{"product_id": p.id, "op": "remove"} for p in self.products[10:20]]
+            + [{"product_id": p.id, "quantity": 1} for p in self.products[20:]]
+        )
+        with self.assertNumQueries(13):  # the removals add a select and two deletes
+            self.bulk(operations)
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(cart.item_count, 30)
+        self.assertEqual(cart.totals["quantity"], 50)
+
+    def test_per_line_results(self):
+        milk, bread = self.products[:2]
+        results = self.bulk([
+            {"product_id": milk.id, "quantity": 3},
+            {"product_id": milk.id, "quantity": 3},  # 6 > stock of 5
+            {"product_id": bread.id, "op": "remove"},
+            {"product_id": 999999, "quantity": 1},
+            {"product_id": bread.id, "op": "set", "quantity": 5},
+        ])
+        self.assertEqual([r["status"] for r in results], ["ok", "error", "error", "error", "ok"])
+        self.assertEqual(results[1]["quantity"], 3)
+        self.assertIn("Only 5 units", results[1]["error"])
+        items = dict(CartItem.objects.values_list("product_id", "quantity"))
+        self.assertEqual(items, {milk.id: 3, bread.id: 5})
+
+    def test_invalid_payload(self):
+        response = self.client.post("/cart/bulk/", [{"product_id": 1, "op": "add", "quantity": 0}], format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/cart/bulk/", {"product_id": 1}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        brand = Brand.objects.create(name="Test Brand")
+        self.product = Product.objects.create(name="Milk", price=2, stock=5, brand=brand)
+        self.clients = []
+        for i in range(2):
+            user = User.objects.create_user(username=f"buyer{i}")
+            Profile.objects.create(user=user, full_name=f"Buyer {i}", phone="123", address="Street", balance=100)
+            client = APIClient()
+            client.force_authenticate(user=user)
+            self.clients.append(client)
+
+    def add(self, client, quantity):
+        return client.post("/cart/add/", {"product_id": self.product.id, "quantity": quantity}, format="json")
+
+    def test_holds_limit_other_carts(self):
+        first, second = self.clients
+        self.assertEqual(self.add(first, 3).status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.reserved, self.product.available), (3, 2))
+        self.assertEqual(self.client.get(f"/products/{self.product.id}/").data["available"], 2)
+
+        response = self.add(second, 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Only 2 units", response.data["error"])
+        self.assertEqual(self.add(first, 2).status_code, 201)  # its own hold counts as available
+
+        item = CartItem.objects.get(cart__user__username="buyer0")
+        first.patch(f"/cart/items/{item.id}/update-quantity/", {"quantity": 1}, format="json")
+        first.post("/cart/remove/", {"product_id": self.product.id}, format="json")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_quantity_update_is_limited_by_other_carts_holds(self):
+        first, second = self.clients
+        self.add(first, 3)
+        self.add(second, 1)
+        item = CartItem.objects.get(cart__user__username="buyer1")
+        with self.assertNumQueries(5):  # the item with its cart, the locked product and hold, a savepoint
+            response = second.patch(f"/cart/items/{item.id}/update-quantity/", {"quantity": 4}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Only 2 units", response.data["error"])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 4)
+
+    def test_expired_holds_are_released(self):
+        self.add(self.clients[0], 4)
+        self.assertEqual(release_expired_holds(), 0)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command("release_expired_holds", stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertEqual(self.add(self.clients[1], 5).status_code, 201)
+
+    def test_outbox_worker_sweeps_expired_holds(self):
+        self.add(self.clients[0], 4)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command("run_worker", "--once", "--threads=0", stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_failed_bulk_operation_does_not_renew_an_expired_hold(self):
+        first, second = self.clients
+        self.add(first, 4)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired_holds()
+        self.add(second, 4)
+
+        response = first.post("/cart/bulk/", [{"product_id": self.product.id, "op": "add", "quantity": 1}], format="json")
+        self.assertEqual(response.data["results"][0]["status"], "error")
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (5, 4))
+        self.assertEqual(StockReservation.objects.get().cart.user.username, "buyer1")
+
+    def test_checkout_converts_holds(self):
+        first, second = self.clients
+        self.add(first, 3)
+        self.assertEqual(first.post("/orders/checkout/").status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (2, 0))
+        self.assertFalse(StockReservation.objects.exists())
 
-# Create your tests here.
+    def test_checkout_without_hold_needs_free_stock(self):
+        first, second = self.clients
+        self.add(first, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired_holds()
+        self.add(second, 4)  # takes the stock while the first cart's hold is gone
+        response = first.post("/orders/checkout/")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Only 1 units", response.data["message"])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (5, 4))
@@ -12,5 +12,6 @@ urlpatterns = [
     path('', cart_list, name='cart-list'),
     path('add/', CartViewSet.as_view({'post' : 'add_item'})),
     path('remove/', CartViewSet.as_view({'post' : 'remove_item'})),
+    path('bulk/', CartViewSet.as_view({'post' : 'bulk'})),
     path('items/<int:pk>/update-quantity/', CartViewSet.as_view({'patch': 'update_quantity'})),
 ]
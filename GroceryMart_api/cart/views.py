@@ -4,8 +4,15 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer, CartItemQuantitySerializer
+from .bulk import MAX_OPERATIONS, apply_operations
+from .reservations import CartHolds, InsufficientStock
+from .serializers import CartSerializer, CartItemSerializer, CartItemQuantitySerializer, CartBulkOperationSerializer
 from product.models import Product
+from django.db import transaction
+from django.db.models import Max, Prefetch, prefetch_related_objects
+from GroceryMart_api.conditional import ConditionalGetMixin, latest
+from GroceryMart_api.serializers import expanded_fields
+from product.cache import catalog_version
 
 
 from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResponse
@@ -21,13 +28,28 @@ from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResp
             )
         }
 )
-class CartViewSet(viewsets.GenericViewSet):
+class CartViewSet(ConditionalGetMixin, viewsets.GenericViewSet):
     permission_classes= [IsAuthenticated]
     serializer_class = CartSerializer
+    bulk_max_operations = MAX_OPERATIONS
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        # the cart's own stamp plus its newest product change, in one query
+        row = Cart.objects.filter(user=request.user).annotate(
+            products_updated_at=Max("items__product__updated_at")
+        ).values_list("id", "updated_at", "products_updated_at").first()
+        if row is None:
+            return None  # no cart yet, list() creates it
+        # expanded products also carry brand, category and reviews
+        version = catalog_version() if "product" in expanded_fields(request) else None
+        return (row, version), latest(*row[1:])
 
     def list(self, request):
-        cart, created = Cart.objects.get_or_create(user= request.user)
-        serializer = CartSerializer(instance= cart)
+        cart = Cart.objects.for_user(request.user)
+        # products as cards by default, full details only with ?expand=product
+        products = Product.objects.with_details() if "product" in expanded_fields(request) else Product.objects.all()
+        prefetch_related_objects([cart], Prefetch("items__product", queryset=products))
+        serializer = CartSerializer(instance= cart, context={"request": request})
         return Response(serializer.data)
     
 
@@ -39,35 +61,42 @@ class CartViewSet(viewsets.GenericViewSet):
     )
     @action(methods=['post'], detail=False)
     def add_item(self, request):
-        cart, created = Cart.objects.get_or_create(user= request.user)
+        cart = Cart.objects.for_user(request.user)
         serializer = CartItemSerializer(data=request.data)
 
         if serializer.is_valid():
             product = serializer.validated_data['product']
             quantity = serializer.validated_data.get('quantity', 1)
 
-            # Check if requested quantity exceeds stock
-            if quantity > product.stock:
-                return Response(
-                    {"error": f"Only {product.stock} units of {product.name} available"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # item, created = CartItem.objects.get_or_create(cart= cart, product=product, quantity=quantity)
-            item, created = CartItem.objects.get_or_create(cart= cart, product=product)
-            if not created:
-                # If item exists, increment quantity and validate stock
-                new_quantity = item.quantity + quantity 
-                if new_quantity > product.stock:
+            with transaction.atomic():
+                # stock held by other carts is not available, see cart/reservations.py
+                holds = CartHolds(cart, [product.id])
+                available = holds.available(product.id)
+
+                # Check if requested quantity exceeds stock
+                if quantity > available:
                     return Response(
-                        {"error": f"Total quantity ({new_quantity}) exceeds available stock ({product.stock}) for {product.name}"},
+                        {"error": f"Only {available} units of {product.name} available"},
                         status=status.HTTP_400_BAD_REQUEST
                     )
-                item.quantity = new_quantity
-            else:
-                item.quantity = quantity
 
-            item.save()
+                # item, created = CartItem.objects.get_or_create(cart= cart, product=product, quantity=quantity)
+                item, created = CartItem.objects.get_or_create(cart= cart, product=product)
+                if not created:
+                    # If item exists, increment quantity and validate stock
+                    new_quantity = item.quantity + quantity
+                    if new_quantity > available:
+                        return Response(
+                            {"error": f"Total quantity ({new_quantity}) exceeds available stock ({available}) for {product.name}"},
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
+                    item.quantity = new_quantity
+                else:
+                    item.quantity = quantity
+
+                item.save()
+                holds.set(product.id, item.quantity)
+                holds.save()
             return Response({"message" : "Item added to cart"}, status= status.HTTP_201_CREATED)
         return Response({"message" : serializer.errors}, status= status.HTTP_400_BAD_REQUEST)
     
@@ -79,12 +108,16 @@ class CartViewSet(viewsets.GenericViewSet):
     )
     @action(detail=False, methods=['post'])
     def remove_item(self, request):
-        cart, _ = Cart.objects.get_or_create(user= request.user)
+        cart = Cart.objects.for_user(request.user)
         product_id = request.data.get('product_id')
 
         try :
-            product = CartItem.objects.get(cart= cart, product_id=product_id)
-            product.delete()
+            with transaction.atomic():
+                item = CartItem.objects.get(cart= cart, product_id=product_id)
+                item.delete()
+                holds = CartHolds(cart, [item.product_id])
+                holds.set(item.product_id, 0)  # gives the held stock back
+                holds.save()
             return Response({"message" : "Item Removed"}, status=status.HTTP_204_NO_CONTENT)
         except CartItem.DoesNotExist:
             return Response({"message" : "Item Not Found"}, status=status.HTTP_404_NOT_FOUND)
@@ -99,18 +132,54 @@ class CartViewSet(viewsets.GenericViewSet):
     @action(detail=True, methods=['patch'])
     def update_quantity(self, request, pk):
         try:
-            item = CartItem.objects.get(pk=pk, cart__user=request.user)
+            item = CartItem.objects.select_related("cart").get(pk=pk, cart__user=request.user)
         except CartItem.DoesNotExist:
             return Response({"detail": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
 
         serializer = CartItemQuantitySerializer(item, data=request.data, partial=True)
         if serializer.is_valid():
-            quantity = serializer.validated_data.get('quantity')
+            quantity = serializer.validated_data.get('quantity', item.quantity)
 
-            if quantity == 0:
-                item.delete()
-                return Response({"message": "Item removed from cart"}, status=status.HTTP_204_NO_CONTENT)
+            with transaction.atomic():
+                holds = CartHolds(item.cart, [item.product_id])
+                try:
+                    holds.check(item.product_id, quantity)
+                except InsufficientStock as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                holds.set(item.product_id, quantity)
+                holds.save()
+
+                if quantity == 0:
+                    item.delete()
+                    return Response({"message": "Item removed from cart"}, status=status.HTTP_204_NO_CONTENT)
 
-            serializer.save()
+                serializer.save()
             return Response({"message": "Quantity updated", "data": serializer.data}, status=status.HTTP_200_OK)
         return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    @extend_schema(
+        summary="Apply several cart changes at once",
+        description=(
+            "Takes a list of {product_id, quantity, op} operations, op is add (default), set or remove. "
+            "Stock is validated for all lines with one product query and the changes are written in one "
+            "transaction. Lines that fail are skipped and reported, the others are applied."
+        ),
+        request=CartBulkOperationSerializer(many=True),
+        responses={
+            200: OpenApiResponse(description="Per-line results: product_id, op, status (ok/error), quantity and error"),
+            400: OpenApiResponse(description="Malformed operations"),
+        },
+        tags=['Cart']
+    )
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = CartBulkOperationSerializer(data=request.data, many=True, max_length=self.bulk_max_operations)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        operations = serializer.validated_data
+
+        with transaction.atomic():
+            results = apply_operations(Cart.objects.for_user(request.user), operations)
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
@@ -0,0 +1,244 @@
+"""
+Checkout of a cart into an order.
+
+CheckoutService is the one place that turns a cart into a paid order, for the balance
+checkout ( orders.views.CheckoutView ) as well as for the payment gateways
+( payments.gateway.PaymentGateway.process_order ). In one transaction it:
+
+    1. snapshots the cart lines, in product id order, from the items prefetched with
+       Cart.objects.with_items(), so the cart is read once,
+    2. runs the payment step ( a PaymentStep, e.g. BalancePayment ),
+    3. creates the order, or marks the gateway's pending order paid, and its items with
+       one bulk_create,
+    4. clears the cart,
+    5. takes the stock with cart.reservations.commit_holds(), which validates it with one
+       conditional UPDATE of the products matched in id order. Done last, so the product
+       rows stay locked only until the commit.
+    6. queues the orders.tasks.order_placed task in the outbox, e.g. the confirmation
+       email, which the worker ( manage.py run_worker ) runs once the order is committed.
+
+Payment gateways split this in two. freeze() runs when the payment starts and writes the
+pending order with the cart lines, at their current prices, as its items. settle() runs
+from the gateway's webhook: the order is marked paid and its frozen items are taken off
+the stock, without reading the cart however long the customer took to pay.
+
+Any failure rolls every step back. The time of each phase is kept in `timings` and
+passed to the `hooks`, e.g. CheckoutService(cart, hooks=[lambda phase, seconds: ...]).
+"""
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+
+from accounts.models import Profile
+from cart.models import Cart, CartItem
+from GroceryMart_api.authentication import forget_user
+from cart.reservations import InsufficientStock, commit_holds, commit_user_holds
+from .models import Order, OrderItem
+from .tasks import order_placed
+
+
+class CheckoutError(ValueError):
+    """A checkout that cannot be placed, `status_code` is the HTTP status to answer with."""
+    status_code = status.HTTP_400_BAD_REQUEST
+
+
+class EmptyCart(CheckoutError):
+    def __init__(self):
+        super().__init__("Cart is empty")
+
+
+class InsufficientBalance(CheckoutError):
+    status_code = status.HTTP_402_PAYMENT_REQUIRED
+
+    def __init__(self):
+        super().__init__("Insufficient balance")
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, error):
+        self.product = error.product
+        self.available = error.available
+        super().__init__(str(error))
+
+
+@dataclass(frozen=True)
+class CheckoutLine:
+    product: object
+    quantity: int
+    price: Decimal
+
+    @property
+    def product_id(self):
+        return self.product.pk
+
+
+class PaymentStep:
+    """
+    Pays for the order inside the checkout transaction, before anything is written.
+    Raise a CheckoutError to refuse. The base step does nothing: the payment gateways
+    have already taken the payment when their webhook places the order.
+    """
+    method = None
+
+    def pay(self, total):
+        pass
+
+
+class BalancePayment(PaymentStep):
+    """
+    Pays from the user's GroceryMart balance, with a conditional UPDATE: the profile may
+    come from the authentication cache, so its balance is neither trusted nor written back,
+    and concurrent checkouts cannot overdraw it.
+    """
+    method = "balance"
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def pay(self, total):
+        paid = Profile.objects.filter(pk=self.profile.pk, balance__gte=total).update(balance=F("balance") - total)
+        if not paid:
+            raise InsufficientBalance()
+        forget_user(self.profile.user_id)
+
+
+class CheckoutService:
+    def __init__(self, cart=None, payment=None, hooks=()):
+        self.cart = cart
+        self.payment = payment or PaymentStep()
+        self.hooks = list(hooks)
+        self.timings = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            for hook in self.hooks:
+                hook(name, self.timings[name])
+
+    def snapshot(self):
+        """The cart lines in product id order, priced at the current product price."""
+        return sorted(
+            (CheckoutLine(item.product, item.quantity, item.product.price) for item in self.cart.items.all()),
+            key=lambda line: line.product_id,
+        )
+
+    def _priced_snapshot(self):
+        lines = self.snapshot()
+        if not lines:
+            raise EmptyCart()
+        return lines, sum((line.price * line.quantity for line in lines), Decimal("0"))
+
+    def _write_items(self, order, lines):
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, product=line.product, product_name=line.product.name, quantity=line.quantity, price=line.price
+            )
+            for line in lines
+        ])
+
+    def freeze(self, payment_method):
+        """
+        Creates the pending order of a payment gateway, with the cart lines frozen into its
+        items by one bulk insert, and returns it. The cart is left as is until settle().
+        """
+        with transaction.atomic():
+            with self.phase("snapshot"):
+                lines, total = self._priced_snapshot()
+            with self.phase("order"):
+                order = Order.objects.create(
+                    user_id=self.cart.user_id, total=total, status="pending", payment_method=payment_method
+                )
+                self._write_items(order, lines)
+        return order
+
+    def settle(self, order):
+        """
+        Places a gateway's order once it is paid: one status transition and the stock
+        decrement of its frozen items, the cart is only cleared of the ordered products.
+        Orders without frozen items are placed from the user's cart. Raises like place().
+        """
+        return self._failing(order, self._settle)
+
+    def place(self, order=None):
+        """
+        Places the order and returns it. `order` is the pending order of a payment gateway,
+        without it a new order is created for the payment step's method. Raises a
+        CheckoutError, with nothing written, when the order cannot be placed; a gateway's
+        order is then marked failed.
+        """
+        return self._failing(order, self._place)
+
+    def _failing(self, order, place):
+        try:
+            with transaction.atomic():
+                return place(order)
+        except OutOfStock:
+            if order is not None:
+                order.status = "failed"
+                order.save(update_fields=["status", "updated_at"])
+            raise
+
+    def _settle(self, order):
+        with self.phase("snapshot"):
+            quantities = dict(OrderItem.objects.filter(order=order).values_list("product_id", "quantity"))
+        if not quantities:
+            # the payment was started before orders had their items frozen
+            self.cart = self.cart or Cart.objects.with_items().filter(user_id=order.user_id).first()
+            if self.cart is None:
+                raise EmptyCart()
+            return self._place(order)
+
+        with self.phase("order"):
+            Order.objects.filter(pk=order.pk).update(status="paid", updated_at=timezone.now())
+            order.status = "paid"
+
+        with self.phase("clear"):
+            CartItem.objects.filter(cart__user_id=order.user_id, product_id__in=quantities).delete()
+
+        with self.phase("stock"):
+            try:
+                commit_user_holds(order.user_id, quantities)
+            except InsufficientStock as e:
+                raise OutOfStock(e) from e
+
+        order_placed.delay(order_id=order.pk)
+        return order
+
+    def _place(self, order):
+        with self.phase("snapshot"):
+            lines, total = self._priced_snapshot()
+
+        with self.phase("payment"):
+            self.payment.pay(total)
+
+        with self.phase("order"):
+            if order is None:
+                order = Order.objects.create(
+                    user_id=self.cart.user_id, total=total, status="paid", payment_method=self.payment.method
+                )
+            else:
+                order.status = "paid"
+                order.save()
+            self._write_items(order, lines)
+
+        with self.phase("clear"):
+            CartItem.objects.filter(cart=self.cart).delete()
+
+        with self.phase("stock"):
+            try:
+                commit_holds(self.cart, {line.product_id: line.quantity for line in lines})
+            except InsufficientStock as e:
+                raise OutOfStock(e) from e
+
+        order_placed.delay(order_id=order.pk)
+        return order
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:08
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_product_names(apps, schema_editor):
+    """Existing items get the product's current name, the closest to the purchase-time name still known."""
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Product = apps.get_model("product", "Product")
+    OrderItem.objects.update(product_name=Subquery(Product.objects.filter(pk=OuterRef("product_id")).values("name")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_order_updated_at"),
+        ("product", "0011_product_reserved"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_name",
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.RunPython(snapshot_product_names, migrations.RunPython.noop),
+    ]
@@ -24,6 +24,13 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, blank=True, null=True) # Payment method used. 
     payment_event_id = models.CharField(max_length=255, null=True, blank=True, unique=True) # Unique payment event ID for idempotency Check.
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # order history: a user's orders newest first, keyset paginated
+            models.Index(fields=["user", "created_at", "id"], name="order_user_created_id_idx"),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.user.username}"
@@ -31,8 +38,14 @@ class Order(models.Model):
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
+    product_name = models.CharField(max_length=200, blank=True)  # name at purchase time, history needs no product join
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    def save(self, *args, **kwargs):
+        if not self.product_name:
+            self.product_name = self.product.name
+        super().save(*args, **kwargs)
+
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
+        return f"{self.quantity} x {self.product_name}"
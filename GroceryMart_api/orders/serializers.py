@@ -1,17 +1,20 @@
 from rest_framework import serializers
 from .models import Order, OrderItem
+from product.serializers import ProductCardSerializer
+from GroceryMart_api.serializers import DynamicFieldsMixin
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    """Serializer for order item."""
-    product_name = serializers.ReadOnlyField(source="product.name")
+class OrderItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer for order item, ?expand=product replaces the product id with its card."""
+    expandable_fields = {"product": (ProductCardSerializer, {"read_only": True})}
 
     class Meta:
         model = OrderItem
         fields = ["id", "product", "product_name", "quantity", "price"]
+        read_only_fields = ["product_name"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for orders, including items."""
     items = OrderItemSerializer(many=True, read_only=True)
 
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.template.loader import render_to_string
+
+from outbox.mail import delivery_connection
+from outbox.queue import task
+from .models import Order
+
+
+@task(name="orders.order_placed")
+def order_placed(order_id):
+    """Work that follows a paid order without holding up the checkout: the confirmation email."""
+    order = Order.objects.select_related("user").filter(pk=order_id, status="paid").first()
+    if order is None or not order.user.email:
+        return
+    body = render_to_string(
+        "email/order_placed.txt", {"order": order, "user": order.user, "items": order.items.order_by("pk")}
+    )
+    message = EmailMessage(f"Your GroceryMart order #{order.pk}", body, settings.DEFAULT_FROM_EMAIL, [order.user.email])
+    delivery_connection().send_messages([message])
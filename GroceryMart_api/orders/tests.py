@@ -1,3 +1,103 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import Profile
+from cart.models import Cart, CartItem
+from product.models import Brand, Product
+from .checkout import BalancePayment, CheckoutService, InsufficientBalance, OutOfStock
+from .models import Order, OrderItem
+
+
+class CheckoutServiceTests(TestCase):
+    def setUp(self):
+        brand = Brand.objects.create(name="Test Brand")
+        self.milk = Product.objects.create(name="Milk", price=2, stock=5, brand=brand)
+        self.bread = Product.objects.create(name="Bread", price=1, stock=3, brand=brand)
+        self.user = User.objects.create_user(username="buyer")
+        self.profile = Profile.objects.create(user=self.user, full_name="Buyer", phone="1", address="Street", balance=10)
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.milk, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.bread, quantity=1)
+
+    def cart_with_items(self):
+        return Cart.objects.with_items().get(pk=self.cart.pk)
+
+    def test_balance_checkout_reports_every_phase(self):
+        phases = []
+        service = CheckoutService(
+            self.cart_with_items(), payment=BalancePayment(self.profile), hooks=[lambda name, _: phases.append(name)]
+        )
+        order = service.place()
+        self.assertEqual((order.status, order.payment_method, order.total), ("paid", "balance", 5))
+        self.assertEqual(phases, ["snapshot", "payment", "order", "clear", "stock"])
+        self.assertEqual(set(service.timings), set(phases))
+        self.assertEqual(list(order.items.order_by("product_id").values_list("product_id", "quantity")),
+                         [(self.milk.id, 2), (self.bread.id, 1)])
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(Profile.objects.get(pk=self.profile.pk).balance, 5)
+
+    def test_payment_refusal_writes_nothing(self):
+        Profile.objects.filter(pk=self.profile.pk).update(balance=1)  # the payment reads the balance from the database
+        with self.assertRaises(InsufficientBalance):
+            CheckoutService(self.cart_with_items(), payment=BalancePayment(self.profile)).place()
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_gateway_order_is_marked_failed_when_stock_falls_short(self):
+        order = Order.objects.create(user=self.user, total=5, status="pending", payment_method="stripe")
+        Product.objects.filter(pk=self.bread.pk).update(stock=0)
+        with self.assertRaises(OutOfStock):
+            CheckoutService(self.cart_with_items()).place(order)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "failed")
+        self.assertFalse(order.items.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.stock, 5)
+
+    def test_gateway_order_is_frozen_at_initiation_and_settled_without_the_cart(self):
+        order = CheckoutService(self.cart_with_items()).freeze("stripe")
+        self.assertEqual((order.status, order.payment_method, order.total), ("pending", "stripe", 5))
+        # the cart and the prices change while the customer is on the gateway's page
+        Product.objects.filter(pk=self.milk.pk).update(price=3)
+        CartItem.objects.filter(product=self.bread).update(quantity=3)
+        egg = Product.objects.create(name="Egg", price=1, stock=3, brand=self.milk.brand)
+        CartItem.objects.create(cart=self.cart, product=egg, quantity=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            CheckoutService().settle(order)
+        statements = [query["sql"] for query in queries if "SAVEPOINT" not in query["sql"]]
+        self.assertEqual(len(statements), 8)  # items, status, clear ( 3 ), holds, stock, outbox task
+        self.assertFalse(any("cart_cartitem" in sql for sql in statements[:2]))
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.total), ("paid", 5))
+        self.assertEqual(list(order.items.order_by("product_id").values_list("product_id", "quantity", "price")),
+                         [(self.milk.id, 2, 2), (self.bread.id, 1, 1)])
+        self.assertEqual(list(Product.objects.order_by("pk").values_list("stock", flat=True)), [3, 2, 3])
+        self.assertEqual(list(CartItem.objects.values_list("product_id", flat=True)), [egg.id])  # added later, kept
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.milk = Product.objects.create(name="Milk", price=2, stock=5, brand=Brand.objects.create(name="Brand"))
+        for _ in range(15):
+            order = Order.objects.create(user=self.user, total=2, status="paid")
+            OrderItem.objects.create(order=order, product=self.milk, quantity=1, price=2)
+
+    def test_history_pages_need_no_product_queries(self):
+        Product.objects.filter(pk=self.milk.pk).update(name="Whole milk")  # renamed after the purchases
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/orders/", {"cursor": ""})
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(response.data["results"][0]["items"][0]["product_name"], "Milk")
+        self.assertEqual(len(queries), 3)  # conditional stamp, orders, items
+        self.assertFalse(any('"product_product"' in query["sql"] for query in queries))
+
+        response = self.client.get("/orders/", {"cursor": "", "expand": "product"})
+        self.assertEqual(response.data["results"][0]["items"][0]["product"]["name"], "Whole milk")
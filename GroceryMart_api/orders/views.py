@@ -6,28 +6,46 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from cart.models import Cart, CartItem
-from .models import Order, OrderItem
+from cart.models import Cart
+from .checkout import BalancePayment, CheckoutError, CheckoutService
+from .models import Order
 from .serializers import OrderSerializer
-from product.models import Product
 
-from django.db import transaction
-from django.db.models import F
+from django.db.models import Count, Max
 
 from drf_spectacular.utils import extend_schema, OpenApiResponse
+from GroceryMart_api.conditional import ConditionalGetMixin, latest
+from GroceryMart_api.pagination import KeysetPagination
+from GroceryMart_api.serializers import expanded_fields
+
+
+def order_items(request):
+    """The items prefetch: the product name is stored on the item, products are read only for ?expand=product."""
+    if "product" in expanded_fields(request):
+        return "items__product"
+    return "items"
 
 
 @extend_schema(
     summary="List user's order history", 
     tags=["Orders"]
 )
-class OrderListAPIView(ListAPIView):
+class OrderListAPIView(ConditionalGetMixin, ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = None
+    pagination_class = KeysetPagination  # ?page=2 or ?cursor= for keyset pages
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        # high-water mark of the user's orders: new orders, status changes and deletions all move it.
+        # Items carry their product name, so product changes only matter with ?expand=product
+        marks = {"count": Count("id"), "updated_at": Max("updated_at")}
+        if "product" in expanded_fields(request):
+            marks.update(count=Count("id", distinct=True), products_updated_at=Max("items__product__updated_at"))
+        mark = Order.objects.filter(user=request.user).aggregate(**marks)
+        return tuple(mark.values()), latest(mark["updated_at"], mark.get("products_updated_at"))
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by("-created_at")
+        return Order.objects.filter(user=self.request.user).prefetch_related(order_items(self.request)).order_by("-created_at")
 
 
 # Retrieve a single order by ID (if it belongs to the user)
@@ -35,13 +53,25 @@ class OrderListAPIView(ListAPIView):
     summary="Retrieve order details",
     tags=['Orders']
 )
-class OrderDetailView(RetrieveAPIView):
+class OrderDetailView(ConditionalGetMixin, RetrieveAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = "id"
 
+    def get_conditional_state(self, request, *args, **kwargs):
+        orders = Order.objects.filter(user=request.user, id=kwargs["id"])
+        if "product" in expanded_fields(request):
+            row = orders.annotate(products_updated_at=Max("items__product__updated_at")).values_list(
+                "updated_at", "products_updated_at"
+            ).first()
+        else:
+            row = orders.values_list("updated_at").first()
+        if row is None:
+            return None  # let retrieve() answer the 404
+        return row, latest(*row)
+
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).prefetch_related(order_items(self.request))
 
 @extend_schema(
     summary="Checkout and place order using balance",
@@ -51,63 +81,15 @@ class OrderDetailView(RetrieveAPIView):
 class CheckoutView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
     def post(self, request):
-        cart = Cart.objects.filter(user=request.user).first()
-        if not cart or not cart.items.exists():
-            return Response(
-                {"message": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
-            )
-
-        total = cart.total
-
-        if request.user.profile.balance < total:
-            return Response(
-                {"message": "Insufficient balance"},
-                status=status.HTTP_402_PAYMENT_REQUIRED,
-            )
-
-        # Lock all products in cart
-        product_ids = [item.product.id for item in cart.items.all()]
-        products = Product.objects.select_for_update().filter(id__in=product_ids)
-        product_map = {p.id: p for p in products}
-
-        # Checking product stock
-        for item in cart.items.all():
-            product = product_map[item.product.id]
-            if item.quantity > product.stock:
-                return Response(
-                    {
-                        "message": f"Only {product.stock} units of {product.name} is Available"
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-        # Deducting the users balance
-        request.user.profile.balance -= total
-        request.user.profile.save()
-
-        # Creating order
-        order = Order.objects.create(user=request.user, total=total, status="paid", payment_method='balance')
-
-        for item in cart.items.all():
-            product = product_map[item.product.id]
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item.quantity,
-                price=product.price,
-            )
-
-            # Reducing the product's stock
-            Product.objects.filter(id=product.id).update(
-                stock=F("stock") - item.quantity
-            )
-
-        # cleared the cart
-        cart.items.all().delete()
-
-        # TODO: Celery task will be triggered here
+        cart = Cart.objects.for_user(request.user).load_items()
+
+        # snapshot, balance payment, order and items, cart clearing and stock decrements,
+        # all in one transaction that is rolled back on any failure
+        try:
+            CheckoutService(cart, payment=BalancePayment(request.user.profile)).place()
+        except CheckoutError as e:
+            return Response({"message": str(e)}, status=e.status_code)
 
         return Response(
             {"message": "Order placed successfully"}, status=status.HTTP_201_CREATED
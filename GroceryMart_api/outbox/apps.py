@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class OutboxConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "outbox"
+
+    def ready(self):
+        # registers the @task functions of every app's tasks.py, for the worker to look up
+        autodiscover_modules("tasks")
@@ -0,0 +1,59 @@
+"""
+An email backend that queues the messages in the outbox instead of sending them.
+
+With EMAIL_BACKEND = "outbox.mail.QueuedEmailBackend" every email, djoser's activation
+and password mails included, is queued as an outbox.tasks.send_email task and delivered
+by the worker through OUTBOX_EMAIL_BACKEND ( the SMTP backend by default ), with its
+retries. Messages with attachments are not queued, they go out right away.
+"""
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+
+def delivery_connection(**kwargs):
+    return get_connection(
+        getattr(settings, "OUTBOX_EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend"), **kwargs
+    )
+
+
+def to_payload(message):
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "from_email": message.from_email,
+        "to": list(message.to),
+        "cc": list(message.cc),
+        "bcc": list(message.bcc),
+        "reply_to": list(message.reply_to),
+        "headers": dict(message.extra_headers),
+        "alternatives": [list(alternative) for alternative in getattr(message, "alternatives", [])],
+        "content_subtype": message.content_subtype,
+    }
+
+
+def from_payload(payload):
+    payload = dict(payload)
+    alternatives = payload.pop("alternatives", [])
+    content_subtype = payload.pop("content_subtype", "plain")
+    message = EmailMultiAlternatives(**payload)
+    for content, mimetype in alternatives:
+        message.attach_alternative(content, mimetype)
+    message.content_subtype = content_subtype
+    return message
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        from .tasks import send_email
+
+        sent = 0
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            if message.attachments:
+                sent += delivery_connection(fail_silently=self.fail_silently).send_messages([message]) or 0
+                continue
+            send_email.delay(**to_payload(message))
+            sent += 1
+        return sent
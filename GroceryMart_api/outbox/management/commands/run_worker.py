@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from outbox.queue import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the outbox tasks on a thread pool and the periodic jobs, until stopped or, with --once, "
+        "until the queue is empty."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4, help="Tasks run side by side (0 runs them in this thread)")
+        parser.add_argument("--batch-size", type=int, default=None, help="Tasks claimed at a time (twice --threads)")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument(
+            "--visibility-timeout", type=float, default=None,
+            help="Seconds a claimed task is kept from other workers (OUTBOX_VISIBILITY_TIMEOUT)",
+        )
+        parser.add_argument("--once", action="store_true", help="Exit once no task is due")
+
+    def handle(self, *args, **options):
+        timeout = options["visibility_timeout"]
+        worker = Worker(
+            threads=options["threads"],
+            batch_size=options["batch_size"],
+            timeout=timedelta(seconds=timeout) if timeout else None,
+        )
+        if not options["once"]:
+            self.stdout.write(f"Running outbox tasks on {options['threads']} threads")
+            worker.run_forever(interval=options["interval"])
+            return
+
+        ran = 0
+        try:
+            while batch := worker.run_once():
+                ran += batch
+        finally:
+            worker.shutdown()
+        self.stdout.write(self.style.SUCCESS(f"Ran {ran} tasks"))
@@ -0,0 +1,201 @@
+"""
+A database-backed task queue, the outbox.
+
+Functions decorated with @task, in any app's tasks.py, are queued with .delay(**payload):
+
+    @task()
+    def send_order_confirmation(order_id):
+        ...
+
+    send_order_confirmation.delay(order_id=order.pk)
+
+.delay() only inserts an outbox.models.Task row, in the caller's transaction, so the task
+is queued if and only if the change that calls for it is committed, and the request
+returns without waiting for it. The payload must be JSON serializable.
+
+The tasks are run by Worker ( manage.py run_worker ), any number of them side by side:
+
+    - a batch of due tasks is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so two
+      workers never claim the same task. A claim lasts OUTBOX_VISIBILITY_TIMEOUT seconds
+      ( 5 minutes by default ), a task whose worker died is claimed again after that.
+    - a task that raises is retried after OUTBOX_RETRY_DELAY seconds ( 10 by default ),
+      doubled on each attempt up to OUTBOX_MAX_RETRY_DELAY ( an hour ), and marked failed
+      after its max_attempts.
+
+A task can run more than once, e.g. when it outlives its claim, so tasks must be idempotent.
+
+Housekeeping that is not triggered by a change, e.g. releasing expired cart holds, is
+registered with @periodic(every=seconds) and run by every worker's loop at that pace.
+"""
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+periodic_jobs = {}  # name: (function, seconds between runs)
+
+
+def task(name=None, max_attempts=5):
+    """Registers the function as a task under `name`, its dotted path by default, and adds .delay()."""
+    def decorator(func):
+        task_name = name or f"{func.__module__}.{func.__name__}"
+        registry[task_name] = func
+        func.task_name = task_name
+        func.delay = lambda **payload: enqueue(task_name, payload, max_attempts=max_attempts)
+        return func
+    return decorator
+
+
+def periodic(every, name=None):
+    """
+    Registers the function to be run by the worker's loop once every `every` seconds, in the
+    loop's thread. An exception is logged and the job runs again at its next turn.
+    """
+    def decorator(func):
+        periodic_jobs[name or f"{func.__module__}.{func.__name__}"] = (func, every)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=5):
+    """Queues the task `name`, to run `delay` seconds from now at the earliest, and returns its row."""
+    return Task.objects.create(
+        name=name,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def visibility_timeout():
+    return timedelta(seconds=getattr(settings, "OUTBOX_VISIBILITY_TIMEOUT", 5 * 60))
+
+
+def retry_delay(attempts):
+    """The wait before the next attempt of a task that failed its `attempts`-th attempt."""
+    base = getattr(settings, "OUTBOX_RETRY_DELAY", 10)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), getattr(settings, "OUTBOX_MAX_RETRY_DELAY", 60 * 60)))
+
+
+def claim(batch_size, timeout=None):
+    """
+    Claims up to `batch_size` due tasks, the pending ones and those whose claim expired,
+    and returns them with their attempt counted.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # a task whose last attempt never reported back, e.g. its worker was killed
+        Task.objects.filter(status="running", run_after__lte=now, attempts__gte=F("max_attempts")).update(
+            status="failed", last_error="Claim expired on the last attempt", updated_at=now
+        )
+        ids = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status__in=["pending", "running"], run_after__lte=now)
+            .order_by("run_after")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        Task.objects.filter(pk__in=ids).update(
+            status="running", attempts=F("attempts") + 1, run_after=now + (timeout or visibility_timeout()), updated_at=now
+        )
+    return list(Task.objects.filter(pk__in=ids).order_by("run_after", "pk"))
+
+
+def run(claimed):
+    """
+    Runs a claimed task and records the outcome. Returns True when the task succeeded.
+    The outcome is only written while the claim is still this worker's, i.e. the task
+    was not claimed again, with one more attempt, in the meantime.
+    """
+    ours = Task.objects.filter(pk=claimed.pk, status="running", attempts=claimed.attempts)
+    func = registry.get(claimed.name)
+    if func is None:
+        ours.update(status="failed", last_error=f"Unknown task {claimed.name!r}", updated_at=timezone.now())
+        return False
+    try:
+        func(**claimed.payload)
+    except Exception:
+        logger.exception("Task %s #%s failed", claimed.name, claimed.pk)
+        now = timezone.now()
+        if claimed.attempts >= claimed.max_attempts:
+            ours.update(status="failed", last_error=traceback.format_exc(), updated_at=now)
+        else:
+            ours.update(
+                status="pending", last_error=traceback.format_exc(), run_after=now + retry_delay(claimed.attempts),
+                updated_at=now,
+            )
+        return False
+    ours.update(status="done", last_error="", updated_at=timezone.now())
+    return True
+
+
+class Worker:
+    """
+    Claims and runs due tasks on a pool of `threads` threads, each with its own database
+    connection. threads=0 runs them one by one in the calling thread.
+    """
+
+    def __init__(self, threads=4, batch_size=None, timeout=None):
+        self.threads = threads
+        self.batch_size = batch_size or max(threads, 1) * 2
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="outbox") if threads else None
+        self.next_runs = {}  # periodic job name: time.monotonic() it is due at
+
+    def run_periodic(self):
+        """Runs the periodic jobs that are due."""
+        for name, (func, every) in periodic_jobs.items():
+            if time.monotonic() < self.next_runs.get(name, 0):
+                continue
+            try:
+                func()
+            except Exception:
+                logger.exception("Periodic job %s failed", name)
+            self.next_runs[name] = time.monotonic() + every
+
+    def run_once(self):
+        """
+        Runs the due periodic jobs and one claimed batch to the end, returns the number of
+        tasks the batch held.
+        """
+        self.run_periodic()
+        tasks = claim(self.batch_size, self.timeout)
+        if self.pool is None:
+            for claimed in tasks:
+                run(claimed)
+        else:
+            list(self.pool.map(self._run_in_thread, tasks))
+        return len(tasks)
+
+    def run_forever(self, interval=1.0):
+        """Keeps running batches, sleeping `interval` seconds whenever the queue is empty."""
+        try:
+            while True:
+                if not self.run_once():
+                    time.sleep(interval)
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+    @staticmethod
+    def _run_in_thread(claimed):
+        try:
+            return run(claimed)
+        finally:
+            # the pool's threads outlive the task, don't leave their connections open
+            connection.close()
@@ -0,0 +1,8 @@
+from .mail import delivery_connection, from_payload
+from .queue import task
+
+
+@task(name="outbox.send_email", max_attempts=8)
+def send_email(**message):
+    """Delivers an email queued by outbox.mail.QueuedEmailBackend."""
+    delivery_connection().send_messages([from_payload(message)])
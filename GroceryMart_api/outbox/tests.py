@@ -0,0 +1,106 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Profile
+from cart.models import Cart, CartItem
+from product.models import Brand, Product
+from .models import Task
+from .queue import Worker, claim, enqueue, run, task
+
+calls = []
+
+
+@task(name="outbox.tests.record", max_attempts=3)
+def record(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise RuntimeError("boom")
+
+
+@override_settings(OUTBOX_RETRY_DELAY=10, OUTBOX_VISIBILITY_TIMEOUT=60)
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_queues_and_the_worker_runs_it(self):
+        record.delay(value=1)
+        self.assertEqual(calls, [])
+        self.assertEqual(Worker(threads=0).run_once(), 1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(Task.objects.get().status, "done")
+        self.assertEqual(Worker(threads=0).run_once(), 0)
+
+    def test_failures_back_off_then_fail(self):
+        queued = record.delay(value=1, fail=True)
+        for attempt, delay in [(1, 10), (2, 20)]:
+            Worker(threads=0).run_once()
+            queued.refresh_from_db()
+            self.assertEqual((queued.status, queued.attempts), ("pending", attempt))
+            self.assertIn("RuntimeError: boom", queued.last_error)
+            self.assertAlmostEqual((queued.run_after - timezone.now()).total_seconds(), delay, delta=2)
+            self.assertEqual(Worker(threads=0).run_once(), 0)  # not due yet
+            Task.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+
+        Worker(threads=0).run_once()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ("failed", 3))
+        self.assertEqual(calls, [1, 1, 1])
+
+    def test_expired_claim_is_claimed_again_and_the_stale_outcome_dropped(self):
+        enqueue("outbox.tests.record", {"value": 1})
+        [stale] = claim(10)
+        self.assertEqual(claim(10), [])  # claimed for the visibility timeout
+        Task.objects.filter(pk=stale.pk).update(run_after=timezone.now() - timedelta(seconds=1))
+
+        [fresh] = claim(10)
+        self.assertEqual(fresh.attempts, 2)
+        run(stale)  # the first worker reports back late
+        self.assertEqual(Task.objects.get().status, "running")
+        run(fresh)
+        self.assertEqual(Task.objects.get().status, "done")
+
+    def test_unknown_task_fails(self):
+        enqueue("outbox.tests.missing")
+        Worker(threads=0).run_once()
+        self.assertEqual(Task.objects.get().status, "failed")
+
+
+@override_settings(
+    EMAIL_BACKEND="outbox.mail.QueuedEmailBackend",
+    OUTBOX_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+)
+class QueuedEmailTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com")
+        Profile.objects.create(user=self.user, full_name="Buyer", phone="1", address="Street", balance=10)
+        milk = Product.objects.create(name="Milk", price=2, stock=5, brand=Brand.objects.create(name="Brand"))
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=milk, quantity=2)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_emails_are_sent_by_the_worker(self):
+        message = mail.EmailMultiAlternatives("Hi", "text", "shop@example.com", ["buyer@example.com"])
+        message.attach_alternative("<p>html</p>", "text/html")
+        self.assertEqual(message.send(), 1)
+        self.assertEqual(mail.outbox, [])
+
+        call_command("run_worker", "--once", "--threads=0", stdout=StringIO())
+        [sent] = mail.outbox
+        self.assertEqual((sent.subject, sent.to, sent.alternatives[0][0]), ("Hi", ["buyer@example.com"], "<p>html</p>"))
+
+    def test_checkout_queues_the_order_confirmation(self):
+        self.assertEqual(self.client.post("/orders/checkout/").status_code, 201)
+        self.assertEqual(list(Task.objects.values_list("name", flat=True)), ["orders.order_placed"])
+        self.assertEqual(mail.outbox, [])
+
+        call_command("run_worker", "--once", "--threads=0", stdout=StringIO())
+        [sent] = mail.outbox
+        self.assertIn("2 x Milk", sent.body)
+        self.assertEqual(Task.objects.filter(status="done").count(), 1)
@@ -1,3 +1,6 @@
 from django.contrib import admin
+from .models import ExchangeRate, PaymentEvent
 
 # Register your models here.
+admin.site.register(PaymentEvent)
+admin.site.register(ExchangeRate)
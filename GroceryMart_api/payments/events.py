@@ -0,0 +1,114 @@
+"""
+Payment webhooks, accepted fast and processed later.
+
+The webhook views only verify the request ( Stripe's signature, SSLCOMMERZ's verify_sign ),
+store it with receive() and answer 200. receive() writes a PaymentEvent and queues the
+payments.process_event outbox task in one transaction; a redelivered event id writes
+nothing. The outbox worker ( manage.py run_worker, whose --threads bound the concurrency )
+then runs process(): unless the order is paid already, it re-validates the payment with
+the gateway, outside any transaction, and settles the order with
+PaymentGateway.process_order().
+
+An event is rejected only on the gateway's answer that the payment is not made. When the
+gateway gives no answer ( a network error, a timeout, a 5xx or an open circuit ) it raises
+GatewayUnavailable, the event stays received and the order untouched, and the exception
+is left to the outbox, which retries the task with backoff, like any other exception.
+
+lag() is how far the consumer is behind: the age of the oldest event not yet processed.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from orders.checkout import CheckoutError
+from orders.models import Order
+from .models import PaymentEvent
+from .sslcommerz_gateway import SSLCOMMERZGateway
+from .stripe_custom_gateway import StripeCustomGateway
+from .stripe_gateway import StripeGateway
+from .tasks import process_event
+
+logger = logging.getLogger(__name__)
+
+GATEWAYS = {
+    "sslcommerz": SSLCOMMERZGateway,
+    "stripe": StripeGateway,
+    "stripe_custom": StripeCustomGateway,
+}
+
+
+def receive(gateway, event_id, order_id, payload, event_type=""):
+    """
+    Stores a verified webhook event, `payload` being what the gateway's validate_payment()
+    takes, and queues its processing. Returns False when the event was already received.
+    """
+    try:
+        with transaction.atomic():
+            event = PaymentEvent.objects.create(
+                gateway=gateway,
+                event_id=event_id,
+                event_type=event_type,
+                # a tran_id or metadata that names no order is rejected by process()
+                order_id=order_id if Order.objects.filter(pk=_order_pk(order_id)).exists() else None,
+                payload=payload,
+            )
+            process_event.delay(event_pk=event.pk)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _order_pk(order_id):
+    try:
+        return int(order_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _finish(event, status, error=""):
+    event.status = status
+    event.error = error
+    event.processed_at = timezone.now()
+    event.save(update_fields=["status", "error", "processed_at"])
+    if error:
+        logger.error(f"{event}: {error}")
+    else:
+        logger.info(f"{event} for order {event.order_id}")
+
+
+def process(event):
+    """Validates the event's payment with its gateway and settles the order, at most once."""
+    if event.status != "received":
+        return
+    if event.order_id is None:
+        return _finish(event, "rejected", "Order not found")
+    if Order.objects.filter(pk=event.order_id, status="paid").exists():
+        # settled by an earlier event, nothing to validate, and a bogus event cannot fail it
+        return _finish(event, "processed")
+
+    gateway = GATEWAYS[event.gateway]()
+    # raises GatewayUnavailable, retried by the outbox, when the gateway could not tell
+    success, error = gateway.validate_payment(event.payload)
+    if not success:
+        return _finish(event, "rejected", error)
+
+    with transaction.atomic():
+        # serializes the events of one order, so it is settled once
+        order = Order.objects.select_for_update().get(pk=event.order_id)
+        if order.status == "paid":
+            return _finish(event, "processed")
+        try:
+            gateway.process_order(order)
+        except CheckoutError as e:
+            # the order is marked failed, see CheckoutService.settle()
+            return _finish(event, "failed", f"Stock validation failed: {e}")
+        Order.objects.filter(pk=order.pk).update(payment_event_id=event.event_id)  # kept for the order's history
+        _finish(event, "processed")
+
+
+def lag():
+    """Seconds since the oldest event still waiting for the consumer was received, 0 when none waits."""
+    oldest = PaymentEvent.objects.filter(status="received").aggregate(oldest=Min("received_at"))["oldest"]
+    return (timezone.now() - oldest).total_seconds() if oldest else 0.0
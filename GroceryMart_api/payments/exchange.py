@@ -0,0 +1,148 @@
+"""
+Exchange rates for the Stripe hosted checkout, without an upstream call per checkout.
+
+ExchangeRateProvider.rate("USD", "BDT") answers from an in-process cache:
+
+    - a rate younger than `ttl` seconds ( an hour by default ) is returned as is,
+    - an older one, up to `max_stale` seconds ( a day ), is returned too while one
+      background thread fetches a new one ( stale-while-revalidate ),
+    - without a usable rate the caller fetches one, and concurrent callers for the same
+      pair wait for that single fetch instead of sending their own ( single-flight ).
+
+Every fetched rate is saved as the pair's last known good ExchangeRate row, so a restarted
+process or another node starts from it, and a refresh first looks whether another process
+already stored a fresh rate. When the upstream fails, the last known good rate is used
+however old, and only without any the `fallback` rate.
+
+The options come from EXCHANGE_RATES, e.g. {"ttl": 3600, "max_stale": 86400, "fallback": "110"}.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+
+from .http import get_client
+from .models import ExchangeRate
+
+logger = logging.getLogger(__name__)
+
+RATES_URL = "https://open.exchangerate-api.com/v6/latest/{base}"
+
+
+def fetch_rate(base, quote):
+    """The current rate of `base` in `quote` from the upstream API, None when it has none."""
+    response = get_client("exchangerate").get(RATES_URL.format(base=base))
+    if response.status_code != 200:
+        logger.error(f"Failed to fetch exchange rate: {response.status_code}")
+        return None
+    rate = response.json().get("rates", {}).get(quote)
+    return Decimal(str(rate)) if rate else None
+
+
+def in_background(func):
+    def target():
+        try:
+            func()
+        finally:
+            connection.close()  # the thread's own connection
+
+    threading.Thread(target=target, name="exchange-rate-refresh", daemon=True).start()
+
+
+class ExchangeRateProvider:
+    def __init__(self, ttl=60 * 60, max_stale=24 * 60 * 60, fallback="110", fetch=fetch_rate, clock=time.time,
+                 run_in_background=in_background):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.fallback = Decimal(fallback)
+        self.fetch = fetch
+        self.clock = clock
+        self.run_in_background = run_in_background
+        self._rates = {}  # (base, quote): (rate, fetched at, in seconds since the epoch)
+        self._inflight = {}  # (base, quote): threading.Event set when its refresh is done
+        self._lock = threading.Lock()
+
+    def rate(self, base, quote):
+        """How many `quote` one `base` is worth."""
+        pair = (base.upper(), quote.upper())
+        if pair[0] == pair[1]:
+            return Decimal("1")
+        cached = self._rates.get(pair)
+        if cached is None:
+            cached = self._load(pair)
+        if cached is not None:
+            age = self.clock() - cached[1]
+            if age < self.ttl:
+                return cached[0]
+            if age < self.max_stale:
+                done, leader = self._join(pair)
+                if leader:
+                    self.run_in_background(lambda: self._refresh(pair, done))
+                return cached[0]
+
+        done, leader = self._join(pair)
+        if leader:
+            self._refresh(pair, done)
+        else:
+            done.wait(timeout=30)
+        cached = self._rates.get(pair)
+        if cached is None:
+            logger.error(f"No {pair[0]}->{pair[1]} exchange rate, using the fallback {self.fallback}")
+            return self.fallback
+        return cached[0]
+
+    def _join(self, pair):
+        """The pair's refresh in flight, and whether the caller is the one to run it."""
+        with self._lock:
+            done = self._inflight.get(pair)
+            if done is not None:
+                return done, False
+            done = self._inflight[pair] = threading.Event()
+            return done, True
+
+    def _refresh(self, pair, done):
+        try:
+            stored = self._load(pair)
+            if stored is not None and self.clock() - stored[1] < self.ttl:
+                return  # another process fetched it already
+            try:
+                rate = self.fetch(*pair)
+            except Exception as e:
+                rate = None
+                logger.error(f"Exchange rate fetch failed: {e}")
+            if rate is not None:
+                self._store(pair, rate)
+        finally:
+            with self._lock:
+                self._inflight.pop(pair, None)
+            done.set()
+
+    def _load(self, pair):
+        """The last known good rate from the database, kept in the process cache."""
+        row = ExchangeRate.objects.filter(base=pair[0], quote=pair[1]).first()
+        if row is None:
+            return None
+        cached = self._rates[pair] = (row.rate, row.fetched_at.timestamp())
+        return cached
+
+    def _store(self, pair, rate):
+        fetched_at = self.clock()
+        ExchangeRate.objects.update_or_create(
+            base=pair[0], quote=pair[1],
+            defaults={"rate": rate, "fetched_at": datetime.fromtimestamp(fetched_at, tz=dt_timezone.utc)},
+        )
+        self._rates[pair] = (rate, fetched_at)
+
+
+_provider = None
+
+
+def get_exchange_rate_provider():
+    global _provider
+    if _provider is None:
+        _provider = ExchangeRateProvider(**getattr(settings, "EXCHANGE_RATES", {}))
+    return _provider
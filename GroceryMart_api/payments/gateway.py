@@ -1,9 +1,10 @@
 from abc import ABC, abstractmethod
-from django.db import transaction
-from cart.models import Cart
-from orders.models import Order, OrderItem
-from product.models import Product
-from django.db.models import F
+from orders.checkout import CheckoutService
+
+
+class GatewayUnavailable(Exception):
+    """The gateway gave no answer, e.g. a network error, a timeout or a 5xx: ask again later."""
+
 
 class PaymentGateway(ABC):
     """Abstract base class for payment gateways."""
@@ -14,41 +15,20 @@ class PaymentGateway(ABC):
 
     @abstractmethod
     def validate_payment(self, data):
-        """Validate payment and return success status."""
+        """
+        Validate payment and return success status: (True, None) when the gateway confirms
+        the payment, (False, reason) when it answers that it is not paid. Raises
+        GatewayUnavailable when it could not be asked, which says nothing about the payment.
+        """
         pass
 
     @staticmethod
-    def process_order(cart, order):
-        """Common logic for processing order after successful payment."""
-        with transaction.atomic():
-            product_ids = [item.product.id for item in cart.items.all()]
-            products = Product.objects.select_for_update().filter(id__in=product_ids)
-            product_map = {p.id: p for p in products}
-
-            # Validate stock
-            for item in cart.items.all():
-                product = product_map[item.product.id]
-                if item.quantity > product.stock:
-                    order.status = "failed"
-                    order.save()
-                    raise ValueError(f"Only {product.stock} units of {product.name} available")
-
-            # Update order status
-            order.status = "paid"
-            order.save()
-
-            # Create order items and update stock
-            for item in cart.items.all():
-                product = product_map[item.product.id]
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=item.quantity,
-                    price=product.price,
-                )
-                Product.objects.filter(id=product.id).update(stock=F("stock") - item.quantity)
-
-            # Clear cart
-            cart.items.all().delete()
-
-            return True
\ No newline at end of file
+    def process_order(order):
+        """
+        Common logic for processing order after successful payment: the pending order, whose
+        items were frozen at initiation, is settled with orders.checkout.CheckoutService.
+        Raises a CheckoutError ( a ValueError ) and marks the order failed when the stock
+        falls short.
+        """
+        CheckoutService().settle(order)
+        return True
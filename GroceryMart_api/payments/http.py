@@ -0,0 +1,213 @@
+"""
+The outbound HTTP client of the payment gateways.
+
+get_client(name) returns the shared client of a gateway, e.g. get_client("sslcommerz"):
+
+    - one requests.Session per gateway, whose connection pools ( one per host ) keep the
+      TCP and TLS connections alive between calls,
+    - connect and read timeouts on every call,
+    - retries with full jitter, for connection errors, timeouts, 429 and 5xx answers, of
+      idempotent methods only: a repeated POST could start a second payment session,
+    - a circuit breaker: after `failure_threshold` failed calls in a row the gateway is not
+      called for `reset_timeout` seconds, calls fail at once with CircuitOpenError, then
+      one trial call decides whether it closes again,
+    - latency and error counters per gateway, see stats().
+
+The defaults can be changed with PAYMENTS_HTTP, per gateway under its name, e.g.
+{"timeout": (3.05, 10), "retries": 2, "sslcommerz": {"timeout": (3.05, 20)}}.
+CircuitOpenError is not a requests.RequestException: the gateway was not called at all, so
+callers handle it on its own, e.g. the webhook consumer retries the event later instead of
+taking it for a rejected payment.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+DEFAULTS = {
+    "timeout": (3.05, 10),  # connect, read
+    "retries": 2,
+    "backoff": 0.2,  # seconds, doubled per retry, jittered
+    "failure_threshold": 5,
+    "reset_timeout": 30,
+    "pool_maxsize": 10,
+}
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds, plus one for slower calls
+
+
+class CircuitOpenError(Exception):
+    """The gateway's circuit is open, the call was not sent."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        """Whether a call may go out, while half-open only one trial call at a time."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial:
+                self.trial = True
+                return True
+            return False
+
+    def succeeded(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+
+class HttpClient:
+    def __init__(self, name, timeout=DEFAULTS["timeout"], retries=DEFAULTS["retries"], backoff=DEFAULTS["backoff"],
+                 failure_threshold=DEFAULTS["failure_threshold"], reset_timeout=DEFAULTS["reset_timeout"],
+                 pool_maxsize=DEFAULTS["pool_maxsize"]):
+        self.name = name
+        self.timeout = tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.calls = 0
+        self.errors = {}
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, retry=None, **kwargs):
+        """
+        Sends the request through the breaker, retrying idempotent methods ( or any with
+        retry=True ). Returns the response, 4xx answers included, or raises the last
+        requests.RequestException, or CircuitOpenError without sending it.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = 1 + (self.retries if (retry if retry is not None else method.upper() in IDEMPOTENT_METHODS) else 0)
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            response, error = self._send(method, url, **kwargs)
+            if isinstance(error, CircuitOpenError):
+                break
+            if error is None and response.status_code != 429 and response.status_code < 500:
+                return response
+        if error is not None:
+            raise error
+        return response
+
+    def _send(self, method, url, **kwargs):
+        if not self.breaker.allow():
+            error = CircuitOpenError(f"{self.name} circuit is open")
+            self._record(None, "circuit_open")
+            return None, error
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            self.breaker.failed()
+            self._record(time.perf_counter() - start, type(e).__name__)
+            return None, e
+        elapsed = time.perf_counter() - start
+        if response.status_code == 429 or response.status_code >= 500:
+            self.breaker.failed()
+            self._record(elapsed, f"http_{response.status_code}")
+        else:
+            self.breaker.succeeded()
+            self._record(elapsed, None)
+        return response, None
+
+    def _record(self, elapsed, error):
+        with self._lock:
+            self.calls += 1
+            if elapsed is not None:
+                self.latency[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": dict(self.errors),
+                # cumulative, like a Prometheus histogram: calls that took at most `le` seconds
+                "latency": [
+                    {"le": le, "count": sum(self.latency[:index + 1])}
+                    for index, le in enumerate([*LATENCY_BUCKETS, "+Inf"])
+                ],
+                "circuit": self.breaker.state,
+            }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """The shared client of the gateway `name`, configured by PAYMENTS_HTTP."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                config = getattr(settings, "PAYMENTS_HTTP", {})
+                options = {key: value for key, value in config.items() if key in DEFAULTS}
+                client = _clients[name] = HttpClient(name, **{**options, **config.get(name, {})})
+    return client
+
+
+def configure_stripe():
+    """
+    The Stripe SDK sends its calls with its own HTTP client. It gets the pooled session and
+    the timeouts of the "stripe" client, not its breaker or counters.
+    """
+    client = get_client("stripe")
+    stripe.default_http_client = stripe.RequestsClient(timeout=client.timeout, session=client.session)
+    # Stripe retries POSTs too, safely: the SDK sends them with an idempotency key
+    stripe.max_network_retries = client.retries
+
+
+def stats():
+    return {name: client.stats() for name, client in sorted(_clients.items())}
+
+
+def reset():
+    """Drops the clients, the next calls build them from the current settings."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.session.close()
+        _clients.clear()
@@ -1,3 +1,59 @@
 from django.db import models
 
-# Create your models here.
+from orders.models import Order
+
+
+class PaymentEvent(models.Model):
+    """
+    A verified payment webhook, stored when it arrives and processed later by the outbox
+    worker, see payments/events.py. The gateway's event id makes redeliveries no-ops.
+    """
+    GATEWAY_CHOICES = [
+        ("sslcommerz", "SSLCOMMERZ"),
+        ("stripe", "Stripe"),
+        ("stripe_custom", "Stripe Custom"),
+    ]
+    STATUS_CHOICES = [
+        ("received", "Received"),
+        ("processed", "Processed"),
+        ("rejected", "Rejected"),  # the gateway did not confirm the payment
+        ("failed", "Failed"),  # paid, but the order could not be placed, e.g. out of stock
+    ]
+
+    gateway = models.CharField(max_length=20, choices=GATEWAY_CHOICES)
+    event_id = models.CharField(max_length=255)  # Stripe's event id, SSLCOMMERZ's val_id
+    event_type = models.CharField(max_length=100, blank=True)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name="payment_events")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="received")
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["gateway", "event_id"], name="payment_event_gateway_event_id_uniq"),
+        ]
+        indexes = [
+            # the consumer's lag: the oldest event still waiting
+            models.Index(fields=["status", "received_at"], name="payment_event_status_recv_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway} event {self.event_id} ({self.status})"
+
+
+class ExchangeRate(models.Model):
+    """The last known good rate of a currency pair, see payments/exchange.py."""
+    base = models.CharField(max_length=3)
+    quote = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=18, decimal_places=8)  # one `base` in `quote`
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["base", "quote"], name="exchange_rate_pair_uniq"),
+        ]
+
+    def __str__(self):
+        return f"1 {self.base} = {self.rate} {self.quote}"
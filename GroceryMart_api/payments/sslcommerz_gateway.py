@@ -1,12 +1,18 @@
+import hashlib
+import hmac
+
 import requests
 from django.conf import settings
-from .gateway import PaymentGateway
+from django.utils import timezone
+from .gateway import GatewayUnavailable, PaymentGateway
+from .http import CircuitOpenError, get_client
 from rest_framework import status
 
 class SSLCOMMERZGateway(PaymentGateway):
     """Gateway for SSLCOMMERZ payments."""
     def initiate_payment(self, request, cart, order):
         base_url = getattr(settings, "BASE_URL", "https://grocerymart-jk59.onrender.com")
+        profile = request.user.profile  # loaded with the user by the authentication
         
         payload = {
             "store_id": settings.SSLC_STORE_ID,
@@ -19,13 +25,13 @@ class SSLCOMMERZGateway(PaymentGateway):
             "ipn_url": f"{base_url}/payments/ipn/",
             "cus_name": request.user.get_full_name() or "Unknown",
             "cus_email": request.user.email,
-            "cus_phone": request.user.profile.phone,
-            "cus_add1": request.user.profile.address,
-            "cus_city": request.user.profile.city or "Unknown",
-            "cus_postcode": request.user.profile.postcode or "Unknown",
-            "cus_country": request.user.profile.country or "Unknown",
+            "cus_phone": profile.phone,
+            "cus_add1": profile.address,
+            "cus_city": profile.city or "Unknown",
+            "cus_postcode": profile.postcode or "Unknown",
+            "cus_country": profile.country or "Unknown",
             "shipping_method": "NO",
-            "num_of_item": cart.items.count(),
+            "num_of_item": cart.item_count,
             "product_name": "Cart Items",
             "product_category": "Grocery",
             "product_profile": "physical-goods",
@@ -38,13 +44,31 @@ class SSLCOMMERZGateway(PaymentGateway):
         )
 
         try:
-            resp = requests.post(url, data=payload)
+            resp = get_client("sslcommerz").post(url, data=payload)
             data = resp.json()
             if data.get("status") == "SUCCESS":
                 return {"payment_url": data["GatewayPageURL"]}, status.HTTP_200_OK
             return {"error": data.get("failedreason", "Payment initiation failed")}, status.HTTP_400_BAD_REQUEST
         except requests.RequestException as e:
             return {"error": f"Payment initiation failed: {str(e)}"}, status.HTTP_400_BAD_REQUEST
+        except CircuitOpenError:
+            return {"error": "Payment gateway unavailable, try again later"}, status.HTTP_503_SERVICE_UNAVAILABLE
+
+    @staticmethod
+    def verify_ipn(data):
+        """
+        Whether SSLCOMMERZ signed the IPN: verify_sign is the MD5 of the fields named in
+        verify_key and the MD5 of the store password, as "key=value&..." sorted by key. The
+        tran_id and val_id must be among the signed fields.
+        """
+        keys = [key for key in (data.get("verify_key") or "").split(",") if key]
+        signature = data.get("verify_sign") or ""
+        if not signature or not {"tran_id", "val_id"} <= set(keys):
+            return False
+        fields = {key: data.get(key, "") for key in keys}
+        fields["store_passwd"] = hashlib.md5(settings.SSLC_STORE_PASS.encode()).hexdigest()
+        signed = "&".join(f"{key}={value}" for key, value in sorted(fields.items()))
+        return hmac.compare_digest(hashlib.md5(signed.encode()).hexdigest(), str(signature))
 
     def validate_payment(self, data):
         tran_id = data.get("tran_id")
@@ -72,14 +96,15 @@ class SSLCOMMERZGateway(PaymentGateway):
         }
 
         try:
-            resp = requests.get(validation_url, params=params)
+            resp = get_client("sslcommerz").get(validation_url, params=params)
+            if resp.status_code == 429 or resp.status_code >= 500:
+                raise GatewayUnavailable(f"Payment validation failed: HTTP {resp.status_code}")
             validation = resp.json()
-            if validation.get("status") == "VALID":
-                return True, None
-            order.status = "failed"
-            order.save()
-            return False, "Invalid payment"
-        except requests.RequestException as e:
-            order.status = "failed"
-            order.save()
-            return False, f"Payment validation failed: {str(e)}"
\ No newline at end of file
+        except (requests.RequestException, CircuitOpenError) as e:
+            # no answer about the payment, the order is left as it is
+            raise GatewayUnavailable(f"Payment validation failed: {str(e)}") from e
+        if validation.get("status") == "VALID":
+            return True, None
+        # a paid order stays paid, whatever another val_id says
+        Order.objects.filter(pk=order.pk).exclude(status="paid").update(status="failed", updated_at=timezone.now())
+        return False, "Invalid payment"
\ No newline at end of file
@@ -1,6 +1,6 @@
 import stripe
 from django.conf import settings
-from .gateway import PaymentGateway
+from .gateway import GatewayUnavailable, PaymentGateway
 from rest_framework import status
 import logging
 
@@ -42,6 +42,8 @@ class StripeCustomGateway(PaymentGateway):
             if intent.status == "succeeded":
                 return True, None
             return False, f"Payment status: {intent.status}"
+        except (stripe.error.APIConnectionError, stripe.error.RateLimitError, stripe.error.APIError) as e:
+            raise GatewayUnavailable(f"Stripe validation failed: {str(e)}") from e
         except stripe.error.StripeError as e:
             logger.error(f"Stripe validation error: {str(e)}")
             return False, str(e)
\ No newline at end of file
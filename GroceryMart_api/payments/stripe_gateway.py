@@ -1,10 +1,9 @@
 import stripe
 from django.conf import settings
-from .gateway import PaymentGateway
+from .gateway import GatewayUnavailable, PaymentGateway
+from .exchange import get_exchange_rate_provider
 from rest_framework import status
 import logging
-import requests
-from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
@@ -21,24 +20,9 @@ class StripeGateway(PaymentGateway):
             if currency not in ["usd", "bdt"]:
                 raise ValueError(f"Unsupported currency: {currency}. Only 'usd' and 'bdt' are allowed.")
 
-            # converts the price according to rate if the currency is USD
-            if currency.lower() == "usd":
-                # Fetching current exchange rate (1 USD = X BDT)
-                response = requests.get("https://open.exchangerate-api.com/v6/latest/USD")
-                if response.status_code != 200:
-                    logger.error(f"Failed to fetch exchange rate: {response.status_code}")
-                    rate = Decimal("110")  # Fallback rate 
-                    # raise stripe.error.StripeError("Failed to fetch exchange rate")
-                else:
-                    data = response.json()
-                    if "rates" not in data or "BDT" not in data["rates"]:
-                        rate = Decimal("110")  # Fallback
-                        # raise stripe.error.StripeError("Invalid exchange rate data")
-                    else:
-                        rate = Decimal(str(data["rates"]["BDT"]))
-            else:
-                rate = Decimal("1")  # No conversion needed (e.g., if the currency is "bdt")
-
+            # converts the price according to rate if the currency is USD ( 1 USD = X BDT ),
+            # from the cached rate, see payments/exchange.py
+            rate = get_exchange_rate_provider().rate(currency, "BDT")
 
             session = stripe.checkout.Session.create(
                 payment_method_types=["card"],
@@ -70,6 +54,8 @@ class StripeGateway(PaymentGateway):
             if session.payment_status == "paid":
                 return True, None
             return False, "Payment not completed"
+        except (stripe.error.APIConnectionError, stripe.error.RateLimitError, stripe.error.APIError) as e:
+            raise GatewayUnavailable(f"Stripe validation failed: {str(e)}") from e
         except stripe.error.StripeError as e:
             logger.error(f"Stripe validation error: {str(e)}")
             return False, str(e)
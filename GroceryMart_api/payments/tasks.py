@@ -0,0 +1,12 @@
+from outbox.queue import task
+from .models import PaymentEvent
+
+
+@task(name="payments.process_event", max_attempts=10)  # rides out a gateway outage of an hour or so
+def process_event(event_pk):
+    """Processes a stored payment webhook, see payments/events.py."""
+    from .events import process  # events.py queues this task
+
+    event = PaymentEvent.objects.filter(pk=event_pk).first()
+    if event is not None:
+        process(event)
@@ -1,19 +1,50 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from django.contrib.auth.models import User
 from cart.models import Cart, CartItem
 from product.models import Product, Brand, Category
 from orders.models import Order, OrderItem
+from outbox.models import Task
 from accounts.models import Profile
 from rest_framework import status
+import hashlib
 import stripe
 from django.conf import settings
+from django.core import mail
+import requests
 import responses
 from unittest.mock import patch, MagicMock
+from io import StringIO
+from django.core.management import call_command
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from decimal import Decimal
+from django.test import SimpleTestCase
+from django.utils import timezone
+from . import http
+from .exchange import ExchangeRateProvider
+from .http import CircuitOpenError, HttpClient
+from .models import ExchangeRate, PaymentEvent
 
+
+def run_worker():
+    call_command("run_worker", "--once", "--threads=0", stdout=StringIO())
+
+
+def sslcommerz_ipn(**fields):
+    """The IPN fields signed like SSLCOMMERZ signs them, see SSLCOMMERZGateway.verify_ipn()."""
+    signed = {**fields, "store_passwd": hashlib.md5(settings.SSLC_STORE_PASS.encode()).hexdigest()}
+    sign_string = "&".join(f"{key}={value}" for key, value in sorted(signed.items()))
+    return {**fields, "verify_key": ",".join(fields), "verify_sign": hashlib.md5(sign_string.encode()).hexdigest()}
+
+
+@override_settings(OUTBOX_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
 class PaymentTests(TestCase):
     def setUp(self):
         stripe.api_key = settings.STRIPE_SECRET_KEY
+        http.reset()  # each test starts with closed gateway circuits
+        self.addCleanup(http.reset)  # and leaves none open, e.g. by calls without network
         self.client = APIClient()
         self.user = User.objects.create_user(username="testuser", password="testpass", email="test@example.com")
         Profile.objects.create(
@@ -141,16 +172,24 @@ class PaymentTests(TestCase):
 
         response = self.client.post(
             "/payments/ipn/",
-            {"tran_id": str(order.id), "val_id": "valid_id"},
+            sslcommerz_ipn(tran_id=str(order.id), val_id="valid_id"),
             format="json",
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["status"], "ok")
         order.refresh_from_db()
+        self.assertEqual(order.status, "pending")  # accepted, processed by the worker
+        run_worker()
+        order.refresh_from_db()
         self.assertEqual(order.status, "paid")
         self.assertEqual(OrderItem.objects.count(), 1)
+        self.product.refresh_from_db()
         self.assertEqual(self.product.stock, 98)  # 100 - 2
         self.assertFalse(self.cart.items.exists())
+        # the order confirmation, sent by the worker after the order was paid
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, f"Your GroceryMart order #{order.pk}")
+        self.assertEqual(mail.outbox[0].to, ["test@example.com"])
 
     @responses.activate
     def test_sslcommerz_ipn_failure(self):
@@ -165,13 +204,43 @@ class PaymentTests(TestCase):
 
         response = self.client.post(
             "/payments/ipn/",
-            {"tran_id": str(order.id), "val_id": "invalid_id"},
+            sslcommerz_ipn(tran_id=str(order.id), val_id="invalid_id"),
             format="json",
         )
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data["status"], "Invalid payment")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        run_worker()
         order.refresh_from_db()
         self.assertEqual(order.status, "failed")
+        event = PaymentEvent.objects.get()
+        self.assertEqual((event.status, event.error), ("rejected", "Invalid payment"))
+
+    @responses.activate
+    def test_unsigned_or_tampered_ipn_is_refused(self):
+        order = Order.objects.create(user=self.user, total=20.00, status="pending")
+        unsigned = {"tran_id": str(order.id), "val_id": "valid_id"}
+        tampered = {**sslcommerz_ipn(tran_id="999999", val_id="valid_id"), "tran_id": str(order.id)}
+        unsigned_order = {**sslcommerz_ipn(val_id="valid_id"), "tran_id": str(order.id)}
+        for ipn in (unsigned, tampered, unsigned_order):
+            response = self.client.post("/payments/ipn/", ipn, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["status"], "Invalid IPN signature")
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    @responses.activate
+    def test_event_for_a_paid_order_is_not_validated(self):
+        order = Order.objects.create(user=self.user, total=20.00, status="paid")
+        responses.add(
+            responses.GET,
+            "https://sandbox.sslcommerz.com/validator/api/validationserverAPI.php",
+            json={"status": "INVALID"},
+            status=200
+        )
+        self.client.post("/payments/ipn/", sslcommerz_ipn(tran_id=str(order.id), val_id="other_id"), format="json")
+        run_worker()
+        order.refresh_from_db()
+        self.assertEqual(order.status, "paid")
+        self.assertEqual(len(responses.calls), 0)
+        self.assertEqual(PaymentEvent.objects.get().status, "processed")
 
     @patch('stripe.Webhook.construct_event')
     @patch('stripe.PaymentIntent.retrieve')
@@ -182,6 +251,7 @@ class PaymentTests(TestCase):
         mock_intent.status = "succeeded"
         mock_retrieve.return_value = mock_intent
         mock_construct.return_value = {
+            "id": "evt_123",
             "type": "payment_intent.succeeded",
             "data": {"object": {"id": "pi_123", "metadata": {"order_id": str(order.id)}}}
         }
@@ -195,8 +265,12 @@ class PaymentTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["status"], "ok")
         order.refresh_from_db()
+        self.assertEqual(order.status, "pending")  # accepted, processed by the worker
+        run_worker()
+        order.refresh_from_db()
         self.assertEqual(order.status, "paid")
         self.assertEqual(OrderItem.objects.count(), 1)
+        self.product.refresh_from_db()
         self.assertEqual(self.product.stock, 98)
         self.assertFalse(self.cart.items.exists())
 
@@ -211,4 +285,237 @@ class PaymentTests(TestCase):
             HTTP_STRIPE_SIGNATURE="invalid_signature"
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data["status"], "Invalid Stripe webhook signature")
\ No newline at end of file
+        self.assertEqual(response.data["status"], "Invalid Stripe webhook signature")
+
+    @responses.activate
+    def test_redelivered_ipn_is_processed_once(self):
+        order = Order.objects.create(user=self.user, total=20.00, status="pending")
+        responses.add(
+            responses.GET,
+            "https://sandbox.sslcommerz.com/validator/api/validationserverAPI.php",
+            json={"status": "VALID"},
+            status=200
+        )
+        ipn = sslcommerz_ipn(tran_id=str(order.id), val_id="valid_id")
+        self.assertEqual(self.client.post("/payments/ipn/", ipn, format="json").data["status"], "ok")
+        self.assertEqual(self.client.post("/payments/ipn/", ipn, format="json").data["status"], "already processed")
+        self.assertEqual(len(responses.calls), 0)  # the webhook request does not wait for the gateway
+
+        admin = User.objects.create_user(username="admin", is_staff=True)
+        self.client.force_authenticate(user=admin)
+        lag = self.client.get("/payments/events/lag/").data
+        self.assertEqual(lag["waiting"], 1)
+        self.assertGreaterEqual(lag["lag_seconds"], 0)
+
+        run_worker()
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.payment_event_id), ("paid", "valid_id"))
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(PaymentEvent.objects.get().status, "processed")
+        self.assertEqual(self.client.get("/payments/events/lag/").data, {"waiting": 0, "lag_seconds": 0.0})
+        self.assertEqual(len(mail.outbox), 1)  # one confirmation for the redelivered IPN
+
+
+    @responses.activate
+    @override_settings(PAYMENTS_HTTP={"retries": 0})
+    def test_ipn_validation_failing_once_is_retried(self):
+        order = Order.objects.create(user=self.user, total=20.00, status="pending")
+        url = "https://sandbox.sslcommerz.com/validator/api/validationserverAPI.php"
+        responses.add(responses.GET, url, body=requests.ConnectionError("connection reset"))
+        responses.add(responses.GET, url, json={"status": "VALID"}, status=200)
+        ipn = sslcommerz_ipn(tran_id=str(order.id), val_id="valid_id")
+        self.assertEqual(self.client.post("/payments/ipn/", ipn, format="json").data["status"], "ok")
+
+        run_worker()
+        order.refresh_from_db()
+        self.assertEqual(order.status, "pending")  # no answer is not a rejection
+        self.assertEqual(PaymentEvent.objects.get().status, "received")
+        self.assertEqual(self.client.post("/payments/ipn/", ipn, format="json").data["status"], "already processed")
+
+        Task.objects.update(run_after=timezone.now())  # the retry is due
+        run_worker()
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.payment_event_id), ("paid", "valid_id"))
+        self.assertEqual(PaymentEvent.objects.get().status, "processed")
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_open_circuit_does_not_fail_the_order(self):
+        order = Order.objects.create(user=self.user, total=20.00, status="pending")
+        responses.add(
+            responses.GET,
+            "https://sandbox.sslcommerz.com/validator/api/validationserverAPI.php",
+            json={"status": "VALID"},
+            status=200
+        )
+        breaker = http.get_client("sslcommerz").breaker
+        breaker.opened_at = time.monotonic()  # the gateway failed recently
+        self.client.post("/payments/ipn/", sslcommerz_ipn(tran_id=str(order.id), val_id="valid_id"), format="json")
+
+        run_worker()
+        order.refresh_from_db()
+        self.assertEqual(order.status, "pending")
+        self.assertEqual(PaymentEvent.objects.get().status, "received")
+        self.assertEqual(len(responses.calls), 0)  # the open circuit sent nothing
+
+        breaker.opened_at -= breaker.reset_timeout  # the trial call goes out
+        Task.objects.update(run_after=timezone.now())
+        run_worker()
+        order.refresh_from_db()
+        self.assertEqual(order.status, "paid")
+        self.assertEqual(PaymentEvent.objects.get().status, "processed")
+
+    @patch('stripe.Webhook.construct_event')
+    @patch('stripe.PaymentIntent.retrieve')
+    def test_stripe_validation_failing_once_is_retried(self, mock_retrieve, mock_construct):
+        order = Order.objects.create(user=self.user, total=20.00, status="pending")
+        mock_intent = MagicMock()
+        mock_intent.status = "succeeded"
+        mock_retrieve.side_effect = [stripe.error.APIConnectionError("Network error"), mock_intent]
+        mock_construct.return_value = {
+            "id": "evt_123",
+            "type": "payment_intent.succeeded",
+            "data": {"object": {"id": "pi_123", "metadata": {"order_id": str(order.id)}}}
+        }
+        self.client.post("/payments/stripe-webhook/", {"id": "evt_123"}, format="json", HTTP_STRIPE_SIGNATURE="sig")
+
+        run_worker()
+        order.refresh_from_db()
+        self.assertEqual(order.status, "pending")
+        Task.objects.update(run_after=timezone.now())
+        run_worker()
+        order.refresh_from_db()
+        self.assertEqual(order.status, "paid")
+        self.assertEqual(PaymentEvent.objects.get().status, "processed")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers with the next status of the server's `script`, "slow" sleeps past the read timeout."""
+    def do_GET(self):
+        self.server.hits += 1
+        action = self.server.script.pop(0) if self.server.script else 200
+        if action == "slow":
+            time.sleep(0.5)
+            action = 200
+        body = b'{"status": "VALID"}'
+        self.send_response(action)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.hits, self.server.script = 0, []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        self.client = HttpClient("stub", timeout=(1, 0.2), retries=2, backoff=0.01, failure_threshold=3, reset_timeout=60)
+
+    def test_idempotent_calls_are_retried_posts_are_not(self):
+        self.server.script = [503, "slow", 200]
+        self.assertEqual(self.client.get(self.url).json(), {"status": "VALID"})
+        self.assertEqual(self.server.hits, 3)
+
+        self.server.script = [503]
+        self.assertEqual(self.client.post(self.url).status_code, 503)
+        self.assertEqual(self.server.hits, 4)
+
+        stats = self.client.stats()
+        self.assertEqual((stats["calls"], stats["errors"]), (4, {"http_503": 2, "ReadTimeout": 1}))
+        self.assertEqual(stats["latency"][-1], {"le": "+Inf", "count": 4})
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self.server.script = [500, 500, 500]
+        self.assertEqual(self.client.get(self.url).status_code, 500)
+        self.assertEqual(self.client.stats()["circuit"], "open")
+        with self.assertRaises(CircuitOpenError):
+            self.client.get(self.url)
+        self.assertEqual(self.server.hits, 3)  # the open circuit sent nothing
+
+        self.client.breaker.opened_at -= 60  # reset timeout passed, one trial call closes it
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.stats()["circuit"], "closed")
+
+
+class ExchangeRateTests(TestCase):
+    def setUp(self):
+        self.now = 1_000_000.0
+        self.fetched = []
+        self.upstream = Decimal("120")
+        self.background = []
+
+    def fetch(self, base, quote):
+        self.fetched.append((base, quote))
+        if isinstance(self.upstream, Exception):
+            raise self.upstream
+        return self.upstream
+
+    def provider(self, **options):
+        return ExchangeRateProvider(
+            ttl=60, max_stale=600, fetch=self.fetch, clock=lambda: self.now, run_in_background=self.background.append,
+            **options
+        )
+
+    def test_rate_is_fetched_once_and_kept(self):
+        provider = self.provider()
+        self.assertEqual(provider.rate("usd", "bdt"), Decimal("120"))
+        self.assertEqual(provider.rate("USD", "BDT"), Decimal("120"))
+        self.assertEqual(self.fetched, [("USD", "BDT")])
+        self.assertEqual(ExchangeRate.objects.get().rate, Decimal("120"))
+        self.assertEqual(provider.rate("BDT", "BDT"), Decimal("1"))
+
+        # a new process starts from the stored rate
+        self.assertEqual(self.provider().rate("USD", "BDT"), Decimal("120"))
+        self.assertEqual(len(self.fetched), 1)
+
+    def test_stale_rate_is_served_while_it_is_refreshed(self):
+        provider = self.provider()
+        provider.rate("USD", "BDT")
+        self.now += 120
+        self.upstream = Decimal("121")
+        self.assertEqual(provider.rate("USD", "BDT"), Decimal("120"))  # stale, answered at once
+        self.assertEqual(provider.rate("USD", "BDT"), Decimal("120"))
+        self.assertEqual(len(self.background), 1)  # one refresh for both
+
+        self.background.pop()()
+        self.assertEqual(provider.rate("USD", "BDT"), Decimal("121"))
+        self.assertEqual(len(self.fetched), 2)
+
+    def test_failing_upstream_falls_back_to_the_last_known_good_rate(self):
+        self.upstream = RuntimeError("upstream down")
+        self.assertEqual(self.provider().rate("USD", "BDT"), Decimal("110"))
+
+        ExchangeRate.objects.create(base="USD", quote="BDT", rate=Decimal("118"), fetched_at=timezone.now())
+        self.now = time.time() + 3600  # older than max_stale
+        self.assertEqual(self.provider().rate("USD", "BDT"), Decimal("118"))
+
+    def test_concurrent_misses_share_one_fetch(self):
+        release = threading.Event()
+
+        def slow_fetch(base, quote):
+            self.fetched.append((base, quote))
+            release.wait(5)
+            return Decimal("120")
+
+        provider = ExchangeRateProvider(fetch=slow_fetch)
+        # the database is not part of the race, keep the threads off the test's transaction
+        provider._load = lambda pair: provider._rates.get(pair)
+        provider._store = lambda pair, rate: provider._rates.__setitem__(pair, (rate, time.time()))
+        rates = []
+        threads = [threading.Thread(target=lambda: rates.append(provider.rate("USD", "BDT"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(rates, [Decimal("120")] * 8)
+        self.assertEqual(len(self.fetched), 1)
@@ -4,11 +4,15 @@ from django.shortcuts import render
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.conf import settings
+from django.db import transaction
 from cart.models import Cart
+from cart.reservations import CartHolds
+from orders.checkout import CheckoutService
 from orders.models import Order
-from .gateway import PaymentGateway
+from . import events, http
+from .models import PaymentEvent
 from .stripe_gateway import StripeGateway
 from .stripe_custom_gateway import StripeCustomGateway
 from .sslcommerz_gateway import SSLCOMMERZGateway
@@ -45,49 +49,54 @@ class PaymentInitAPIView(APIView):
         # Get payment method from request
         payment_method = request.data.get("payment_method", "sslcommerz")
 
+        # payment gateway
+        PAYMENT_GATEWAYS = {
+            "sslcommerz": SSLCOMMERZGateway,
+            "stripe": StripeGateway,  # hosted stripe gateway
+            "stripe_custom": StripeCustomGateway,
+        }
+
+        gateway_class = PAYMENT_GATEWAYS.get(payment_method)
+        if not gateway_class:
+            logger.error(f"Invalid payment method: {payment_method}")
+            return Response(
+                {"error": "Invalid payment method"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         try:
-            cart = Cart.objects.get(user=request.user)
+            cart = Cart.objects.for_user(request.user).load_items()  # reused by the gateway, no further cart queries
 
-            if not cart or not cart.items.exists():
+            if not cart.item_count:
                 logger.warning(f"Cart empty for user {request.user.id}")
                 return Response(
                     {"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Validating stock before creating order
-            for item in cart.items.all():
-                if item.quantity > item.product.stock:
-                    logger.warning(
-                        f"Insufficient stock for {item.product.name}: "
-                        f"requested {item.quantity}, available {item.product.stock}"
-                    )
-                    return Response(
-                        {
-                            "error": f"Only {item.product.stock} units of {item.product.name} available"
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-            total = cart.total
-            order = Order.objects.create(
-                user=request.user, total=total, status="pending", payment_method='balance'
-            )
-            logger.info(f"Order {order.id} created for user {request.user.id}")
-
-            # payment gateway
-            PAYMENT_GATEWAYS = {
-                "sslcommerz": SSLCOMMERZGateway,
-                "stripe": StripeGateway,  # hosted stripe gateway
-                "stripe_custom": StripeCustomGateway,
-            }
+            # Validating stock before creating order, and renewing the cart's stock holds
+            # so the stock stays reserved while the customer is on the gateway's page
+            with transaction.atomic():
+                holds = CartHolds(cart, [item.product_id for item in cart.items.all()])
+                for item in cart.items.all():
+                    available = holds.available(item.product_id)
+                    if item.quantity > available:
+                        logger.warning(
+                            f"Insufficient stock for {item.product.name}: "
+                            f"requested {item.quantity}, available {available}"
+                        )
+                        return Response(
+                            {
+                                "error": f"Only {available} units of {item.product.name} available"
+                            },
+                            status=status.HTTP_400_BAD_REQUEST,
+                        )
+                    holds.set(item.product_id, item.quantity)
+                holds.save()
 
-            gateway_class = PAYMENT_GATEWAYS.get(payment_method)
-            if not gateway_class:
-                logger.error(f"Invalid payment method: {payment_method}")
-                return Response(
-                    {"error": "Invalid payment method"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+                # the pending order with the cart lines and prices frozen into its items, the
+                # webhook then only marks it paid and takes the stock
+                order = CheckoutService(cart).freeze(payment_method)
+            logger.info(f"Order {order.id} created for user {request.user.id}")
 
             gateway = gateway_class()
             response_data, status_code = gateway.initiate_payment(request, cart, order)
@@ -109,6 +118,10 @@ class PaymentInitAPIView(APIView):
 )
 @method_decorator(csrf_exempt, name="dispatch")
 class IPNView(APIView):
+    """
+    Verifies the IPN's verify_sign, stores the IPN and answers right away, the payment is
+    validated with SSLCOMMERZ and the order settled by the outbox worker ( payments/events.py ).
+    """
     authentication_classes = []
     permission_classes = []
 
@@ -116,46 +129,18 @@ class IPNView(APIView):
         logger.info(f"SSLCOMMERZ IPN received: {request.data}")
         tran_id = request.data.get("tran_id")
         val_id = request.data.get("val_id")
-        # Basic idempotency: Use val_id as unique event identifier
-        if Order.objects.filter(id=tran_id, payment_event_id=val_id).exists():
-            logger.info(f"IPN event {val_id} for order {tran_id} already processed")
-            return Response({"status": "already processed"}, status=status.HTTP_200_OK)
+        if not tran_id or not val_id:
+            logger.error("SSLCOMMERZ IPN without tran_id or val_id")
+            return Response({"status": "Missing transaction data"}, status=status.HTTP_400_BAD_REQUEST)
+        if not SSLCOMMERZGateway.verify_ipn(request.data):
+            logger.error(f"Invalid SSLCOMMERZ IPN signature for order {tran_id}")
+            return Response({"status": "Invalid IPN signature"}, status=status.HTTP_400_BAD_REQUEST)
 
-        gateway = SSLCOMMERZGateway()
-        success, error = gateway.validate_payment(request.data)
-        if not success:
-            logger.error(f"SSLCOMMERZ validation failed: {error}")
-            return Response({"status": error}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            order = Order.objects.get(id=request.data.get("tran_id"))
-            if order.status == "paid":
-                logger.info(f"Order {order.id} already processed")
-                return Response({"status": "ok"}, status=status.HTTP_200_OK)
-            cart = Cart.objects.get(user=order.user)
-            gateway.process_order(cart, order)
-            order.payment_event_id = val_id  # Store event ID for idempotency
-            order.save()
-            logger.info(f"Order {order.id} processed successfully via SSLCOMMERZ")
-            return Response({"status": "ok"}, status=status.HTTP_200_OK)
-        except Order.DoesNotExist:
-            logger.error(
-                f"Order {request.data.get('tran_id')} not found for SSLCOMMERZ IPN"
-            )
-            return Response(
-                {"status": "order not found"}, status=status.HTTP_404_NOT_FOUND
-            )
-        except ValueError as e:
-            logger.error(f"Stock validation failed for order {order.id}: {str(e)}")
-            return Response(
-                {"status": f"stock error: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST
-            )
-        except Exception as e:
-            logger.error(f"IPN processing error for order {order.id}: {str(e)}")
-            return Response(
-                {"status": f"processing error: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        # Idempotency: val_id is the unique event identifier
+        if not events.receive("sslcommerz", val_id, tran_id, {"tran_id": tran_id, "val_id": val_id}):
+            logger.info(f"IPN event {val_id} for order {tran_id} already received")
+            return Response({"status": "already processed"}, status=status.HTTP_200_OK)
+        return Response({"status": "ok"}, status=status.HTTP_200_OK)
 
 @extend_schema(
     summary="Stripe webhook for payment validation",
@@ -164,6 +149,10 @@ class IPNView(APIView):
 )
 @method_decorator(csrf_exempt, name="dispatch")
 class StripeWebhookView(APIView):
+    """
+    Verifies the signature, stores the event and answers right away, the payment is
+    re-validated with Stripe and the order settled by the outbox worker ( payments/events.py ).
+    """
     authentication_classes = []
     permission_classes = []
 
@@ -174,11 +163,6 @@ class StripeWebhookView(APIView):
 
         try:
             event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
-            # Idempotency: Check if event ID already processed
-            if Order.objects.filter(payment_event_id=event.id).exists():
-                logger.info(f"Stripe event {event.id} already processed")
-                return Response({"status": "already processed"}, status=status.HTTP_200_OK)
-
         except ValueError as e:
             logger.error(f"Invalid Stripe webhook payload: {str(e)}")
             return Response(
@@ -191,87 +175,51 @@ class StripeWebhookView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        stripe_object = event["data"]["object"]
         # checking if the request is Stripe Custom Gateway
         if event["type"] == "payment_intent.succeeded":
-            payment_intent = event["data"]["object"]
-            order_id = payment_intent["metadata"].get("order_id")
-            try:
-                order = Order.objects.get(id=order_id)
-                cart = Cart.objects.get(user=order.user)
-                gateway = StripeCustomGateway()
-                success, error = gateway.validate_payment(
-                    {"payment_intent_id": payment_intent["id"]}
-                )
-                if success:
-                    gateway.process_order(cart, order)
-                    order.payment_event_id = event.id  # Store event ID for idempotency
-                    order.save()
-                    logger.info(
-                        f"Order {order_id} processed successfully via Stripe Custom gateway"
-                    )
-                    return Response({"status": "ok"}, status=status.HTTP_200_OK)
-                logger.error(
-                    f"Stripe payment validation failed for order {order_id}: {error}"
-                )
-                return Response({"status": error}, status=status.HTTP_400_BAD_REQUEST)
-            
-            except Order.DoesNotExist:
-                logger.error(f"Order {order_id} not found for Stripe webhook")
-                return Response(
-                    {"status": "order not found"}, status=status.HTTP_404_NOT_FOUND
-                )
-            except Exception as e:
-                logger.error(f"Error processing payment intent {order_id}: {str(e)}")
-                return Response(
-                    {"status": f"processing error: {str(e)}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-
+            gateway, validation = "stripe_custom", {"payment_intent_id": stripe_object["id"]}
         # checking if the request is Stripe Hosted Gateway
-        elif event["type"] == "checkout.session.completed":
-            session = event["data"]["object"]
-            if session.payment_status == "paid":
-                order_id = session.metadata.get("order_id")
-                try:
-                    order = Order.objects.get(id=order_id)
-                    cart = Cart.objects.get(user=order.user)
-                    gateway = StripeGateway()
-                    success, error = gateway.validate_payment(
-                        {"session_id": session.id}
-                    )
-                    if success:
-                        gateway.process_order(cart, order)
-                        order.payment_event_id = event.id  # Store event ID for idempotency
-                        order.save()
-                        logger.info(
-                            f"Order {order_id} processed successfully via Stripe Hosted"
-                        )
-                        return Response({"status": "ok"}, status=status.HTTP_200_OK)
-                    logger.error(
-                        f"Stripe hosted validation failed for order {order_id}: {error}"
-                    )
-                    return Response(
-                        {"status": error}, status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                except Order.DoesNotExist:
-                    logger.error(
-                        f"Order {order_id} not found for Stripe Hosted webhook"
-                    )
-                    return Response(
-                        {"status": "order not found"}, status=status.HTTP_404_NOT_FOUND
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Error processing checkout session {order_id}: {str(e)}"
-                    )
-                    return Response(
-                        {"status": f"processing error: {str(e)}"},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    )
-
-        logger.info(f"Unhandled Stripe event: {event['type']}")
-        return Response({"status": "unhandled event"}, status=status.HTTP_200_OK)
+        elif event["type"] == "checkout.session.completed" and stripe_object["payment_status"] == "paid":
+            gateway, validation = "stripe", {"session_id": stripe_object["id"]}
+        else:
+            logger.info(f"Unhandled Stripe event: {event['type']}")
+            return Response({"status": "unhandled event"}, status=status.HTTP_200_OK)
+
+        order_id = stripe_object["metadata"].get("order_id")
+        # Idempotency: Stripe redelivers an event with the same id
+        if not events.receive(gateway, event["id"], order_id, validation, event_type=event["type"]):
+            logger.info(f"Stripe event {event['id']} already received")
+            return Response({"status": "already processed"}, status=status.HTTP_200_OK)
+        return Response({"status": "ok"}, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    summary="Payment webhook consumer lag",
+    tags=['Payments'],
+    responses={200: OpenApiResponse(description="Events waiting and the age of the oldest, in seconds")},
+)
+class PaymentEventLagView(APIView):
+    """How far the outbox worker is behind the payment webhooks."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "waiting": PaymentEvent.objects.filter(status="received").count(),
+            "lag_seconds": round(events.lag(), 3),
+        })
+
+
+@extend_schema(
+    summary="Outbound gateway call statistics (admin only)",
+    tags=['Payments'],
+    responses={200: OpenApiResponse(description="Calls, errors, latency histogram and circuit state per gateway")},
+)
+class HttpStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(http.stats())
 
 
 @csrf_exempt
@@ -0,0 +1,99 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+from .models import CacheVersion
+
+
+def version_max_age():
+    return getattr(settings, "CACHE_VERSION_MAX_AGE", 5)
+
+
+def get_version(key):
+    """
+    Reads a version counter. The counters are CacheVersion rows, the same for every process;
+    a process reuses the value it read for CACHE_VERSION_MAX_AGE seconds ( 5 by default ),
+    so a bump made by another process shows up here after that at the latest.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = CacheVersion.objects.filter(key=key).values_list("value", flat=True).first() or 0
+        cache.set(key, version, version_max_age())
+    return version
+
+
+def bump_version(key):
+    if not CacheVersion.objects.filter(key=key).update(value=F("value") + 1):
+        version, created = CacheVersion.objects.get_or_create(key=key, defaults={"value": 1})
+        if not created:  # created by a concurrent bump
+            CacheVersion.objects.filter(key=key).update(value=F("value") + 1)
+    cache.delete(key)  # this process reads the new value right away
+
+
+CATALOG_VERSION_KEY = "product:catalog-version"
+
+
+def catalog_version():
+    """Version of everything the catalog endpoints show, bumped on product/brand/category/review changes."""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+_backend = None
+
+
+def get_response_cache():
+    """
+    Returns the backend configured by CATALOG_CACHE, e.g.
+    {"BACKEND": "GroceryMart_api.cache_backends.SharedCacheBackend", "OPTIONS": {"alias": "default", "timeout": 60}}.
+    """
+    global _backend
+    if _backend is None:
+        config = getattr(settings, "CATALOG_CACHE", {})
+        backend_class = import_string(config.get("BACKEND", "GroceryMart_api.cache_backends.LocMemLRUBackend"))
+        _backend = backend_class(**config.get("OPTIONS", {}))
+    return _backend
+
+
+class CatalogCacheMixin:
+    """
+    Serves anonymous list/retrieve requests from the response cache.
+
+    The key is the catalog version plus the normalized query string, so any catalog
+    change invalidates every entry at once. Stock updates done with queryset.update()
+    send no signals, so stock in cached responses can lag by up to the backend timeout;
+    checkout always re-checks it.
+    """
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        response_cache = get_response_cache()
+        key = self.response_cache_key(request, kwargs)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return Response(cached, headers={"X-Cache": "HIT"})
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(key, response.data)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def response_cache_key(self, request, kwargs):
+        params = sorted((name, sorted(values)) for name, values in request.query_params.lists() if any(values))
+        raw = repr((
+            request.get_host(), self.basename, self.action, sorted(kwargs.items()), params,
+            request.accepted_renderer.format,
+        ))
+        return f"catalog:{catalog_version()}:{hashlib.md5(raw.encode()).hexdigest()}"
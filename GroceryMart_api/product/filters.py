@@ -1,11 +1,36 @@
 from django_filters import rest_framework as filters
+from rest_framework.filters import SearchFilter
 from .models import Product
+from .search import get_search_backend
+from .tree import category_bounds
+
+
+class ProductSearchFilter(SearchFilter):
+    """Handles ?search= with the full-text search backend, results are ranked by relevance."""
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, " ".join(terms))
+
 
 class ProductFilter(filters.FilterSet):
-    """FilterSet for products, supporting price range and brand/category filtering."""
+    """FilterSet for products, supporting price range, rating and brand/category filtering."""
     min_price = filters.NumberFilter(field_name="price", lookup_expr="gte")  # Greater than or equal to
     max_price = filters.NumberFilter(field_name="price", lookup_expr="lte")  # Less than or equal to
+    min_rating = filters.NumberFilter(field_name="rating", lookup_expr="gte")  # uses the stored average rating
+    category_tree = filters.NumberFilter(method="filter_category_tree")  # category and all its subcategories
 
     class Meta:
         model = Product
-        fields = ["brand", "category", "min_price", "max_price"]
\ No newline at end of file
+        fields = ["brand", "category", "category_tree", "min_price", "max_price", "min_rating"]
+
+    def filter_category_tree(self, queryset, name, value):
+        # The subtree is a contiguous lft/rght range, resolved from the cached tree without a query
+        bounds = category_bounds().get(int(value))
+        if bounds is None:
+            return queryset.none()
+        tree_id, lft, rght = bounds
+        return queryset.filter(
+            category__tree_id=tree_id, category__lft__gte=lft, category__rght__lte=rght
+        )
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Stock decrements for checkout.
+
+The whole order is decremented with a single conditional UPDATE ... SET stock = stock - n
+WHERE stock - reserved >= n - held, with per-product CASE expressions for n and held, so
+the stock can never go below what other carts hold or below zero, and no row is locked
+with SELECT ... FOR UPDATE beforehand. The UPDATE still keeps its rows locked until the
+transaction ends, so checkouts take stock as their last step: for a hot product the lock
+is then held only until the commit instead of for the whole order ( see manage.py
+benchmark_checkout ).
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Product
+
+
+class InsufficientStock(ValueError):
+    """Raised when a product cannot cover the requested quantity."""
+    def __init__(self, product, available):
+        self.product = product
+        self.available = max(available, 0)
+        super().__init__(f"Only {self.available} units of {product.name} available")
+
+
+def per_product(values):
+    """CASE expression giving each product id its own value, 0 for the others."""
+    return Case(
+        *[When(pk=product_id, then=Value(value)) for product_id, value in values.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def take_stock(quantities, held=None):
+    """
+    Takes {product_id: quantity} off the stock, and the {product_id: quantity} held for the
+    buyer off Product.reserved, in one UPDATE whatever the size of the order. When a product
+    falls short nothing is decremented and InsufficientStock is raised.
+    """
+    held = held or {}
+    lines = {
+        product_id: (quantities.get(product_id, 0), held.get(product_id, 0))
+        for product_id in set(quantities) | set(held)
+    }
+    if not lines:
+        return
+    with transaction.atomic():
+        updated = Product.objects.filter(
+            pk__in=lines,
+            stock__gte=F("reserved") + per_product({pid: quantity - hold for pid, (quantity, hold) in lines.items()}),
+        ).update(
+            stock=F("stock") - per_product({pid: quantity for pid, (quantity, _) in lines.items()}),
+            reserved=F("reserved") - per_product({pid: hold for pid, (_, hold) in lines.items()}),
+            updated_at=timezone.now(),
+        )
+        if updated == len(lines):
+            return
+        transaction.set_rollback(True)  # a product fell short, undo the rows that were updated
+
+    # Only on failure: find the product for the error message
+    products = Product.objects.in_bulk(lines)
+    for product_id, (quantity, hold) in sorted(lines.items()):
+        product = products.get(product_id)
+        if product is None:
+            raise InsufficientStock(Product(pk=product_id, name="Deleted product"), 0)
+        if product.stock - product.reserved + hold < quantity:
+            raise InsufficientStock(product, product.stock - product.reserved + hold)
+    take_stock(quantities, held)  # the stock changed in between, try again
@@ -0,0 +1,96 @@
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import Profile
+from cart.models import Cart, CartItem
+from orders.models import OrderItem
+from orders.views import CheckoutView
+from product.models import Brand, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Run parallel balance checkouts of one hot product and report throughput, latency and oversell. "
+        "Creates its own users and product and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=200, help="Number of checkouts")
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--stock", type=int, default=100, help="Stock of the product, fewer than buyers to force stock-outs")
+        parser.add_argument("--quantity", type=int, default=1, help="Units per checkout")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        brand = Brand.objects.create(name=f"benchmark-{tag}")
+        product = Product.objects.create(name=f"Hot SKU {tag}", price=1, stock=options["stock"], brand=brand)
+        User.objects.bulk_create([User(username=f"benchmark-{tag}-{i}") for i in range(options["buyers"])])
+        users = list(User.objects.filter(username__startswith=f"benchmark-{tag}-"))
+        Profile.objects.bulk_create([
+            Profile(user=user, full_name=user.username, phone="0", address="-", balance=Decimal("1000000"))
+            for user in users
+        ])
+        Cart.objects.bulk_create([Cart(user=user) for user in users])
+        carts = Cart.objects.filter(user__in=users)
+        # no holds: every checkout competes for the free stock
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=options["quantity"]) for cart in carts])
+
+        try:
+            results, elapsed = self.run(users, options["threads"])
+            self.report(product, results, elapsed, options)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()  # orders, carts and profiles cascade
+            product.delete()
+            brand.delete()
+
+    def run(self, users, threads):
+        view = CheckoutView.as_view()
+        factory = APIRequestFactory()
+
+        def checkout(user):
+            request = factory.post("/orders/checkout/")
+            force_authenticate(request, user=user)
+            start = time.perf_counter()
+            try:
+                status_code = view(request).status_code
+            except Exception as e:
+                status_code = type(e).__name__
+            finally:
+                connection.close()  # the thread's own connection
+            return status_code, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(checkout, users))
+        return results, time.perf_counter() - start
+
+    def report(self, product, results, elapsed, options):
+        product.refresh_from_db()
+        sold = OrderItem.objects.filter(product=product).aggregate(sold=Sum("quantity"))["sold"] or 0
+        codes = [code for code, _ in results]
+        latencies = sorted(latency for _, latency in results)
+        errors = len(codes) - codes.count(201) - codes.count(400)
+
+        self.stdout.write(f"{connection.vendor}: {len(results)} checkouts on {options['threads']} threads in {elapsed:.2f} s")
+        self.stdout.write(f"  throughput   {len(results) / elapsed:8.1f} checkouts/s")
+        self.stdout.write(
+            f"  latency      p50 {statistics.median(latencies) * 1000:.1f} ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms"
+        )
+        self.stdout.write(f"  placed       {codes.count(201)}, out of stock {codes.count(400)}, errors {errors}")
+        self.stdout.write(f"  stock        {options['stock']} -> {product.stock}, {sold} units sold")
+        oversold = max(sold - options["stock"], 0)
+        consistent = product.stock == options["stock"] - sold
+        style = self.style.SUCCESS if not oversold and consistent else self.style.ERROR
+        self.stdout.write(style(f"  oversell     {oversold} units, stock consistent: {consistent}"))
+        if errors:
+            self.stdout.write(self.style.WARNING(f"  error kinds  {sorted(set(code for code in codes if code not in (201, 400)), key=str)}"))
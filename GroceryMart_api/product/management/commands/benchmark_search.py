@@ -0,0 +1,84 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from product.filters import ProductSearchFilter
+from product.models import Brand, Product
+from product.search import get_search_backend
+
+
+WORDS = [
+    "organic", "fresh", "milk", "bread", "rice", "butter", "cheese", "apple", "banana", "chicken",
+    "lentil", "flour", "sugar", "salt", "oil", "tea", "coffee", "honey", "yogurt", "egg",
+]
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "su", "vo", "ne", "par", "di", "zu", "go", "ber", "li"]
+
+
+def vocabulary(rng, size=20_000):
+    """Grocery words plus generated filler words, so terms are as selective as in a real catalog."""
+    words = {"".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size)}
+    return WORDS + sorted(words)
+
+
+class SearchView:
+    search_fields = ["name", "description"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the full-text ?search= backend with the icontains SearchFilter. "
+        "Products are generated inside a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--queries", nargs="+", default=["milk", "organic rice", "chee"])
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        for size in options["sizes"]:
+            with transaction.atomic():
+                self.populate(size)
+                for query in options["queries"]:
+                    icontains = self.measure(SearchFilter(), query, options["repeat"])
+                    fulltext = self.measure(ProductSearchFilter(), query, options["repeat"])
+                    self.stdout.write(
+                        f"{size:>9} products  {query!r:<16} icontains {icontains * 1000:8.2f} ms"
+                        f"  full-text {fulltext * 1000:8.2f} ms"
+                    )
+                transaction.set_rollback(True)
+
+    def populate(self, size):
+        rng = random.Random(size)
+        words = vocabulary(rng)
+        brand = Brand.objects.create(name="Benchmark Brand")
+        batch = []
+        for i in range(size):
+            batch.append(Product(
+                name=" ".join(rng.sample(words, 3)).title(),
+                description=" ".join(rng.choices(words, k=20)),
+                price=rng.randint(1, 500),
+                brand=brand,
+            ))
+            if len(batch) == 10_000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        get_search_backend().rebuild()  # bulk_create skips the indexing signals
+
+    def measure(self, search_filter, query, repeat):
+        request = Request(APIRequestFactory().get("/products/", {"search": query}))
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset = search_filter.filter_queryset(request, Product.objects.all(), SearchView())
+            queryset.count()
+            list(queryset[:10])  # first page, as the list endpoint would fetch it
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,51 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from product.suggest import PrefixIndex
+from .benchmark_search import vocabulary
+
+
+class Command(BaseCommand):
+    help = "Measure build time, memory and lookup latency of the typeahead index on generated names."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--queries", nargs="+", default=["m", "mil", "organic mi", "ka", "zzz"])
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        for size in options["sizes"]:
+            rng = random.Random(size)
+            words = vocabulary(rng)
+            names = [" ".join(rng.sample(words, 3)).title() for _ in range(size)]
+
+            start = time.perf_counter()
+            index = self.build(names)
+            build = time.perf_counter() - start
+
+            # Built a second time under tracemalloc, which slows allocation down too much to time it
+            del index
+            tracemalloc.start()
+            index = self.build(names)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{size:>9} names  build {build:6.2f} s  index memory {memory / 2**20:7.1f} MiB "
+                f"(+ the name strings, which the index shares with its input)"
+            )
+            for query in options["queries"]:
+                start = time.perf_counter()
+                for _ in range(options["repeat"]):
+                    index.suggest(query)
+                per_query = (time.perf_counter() - start) / options["repeat"]
+                self.stdout.write(f"{'':>9}  {query!r:<14} {per_query * 1e6:8.1f} us")
+
+    def build(self, names):
+        index = PrefixIndex()
+        for i, name in enumerate(names, start=1):
+            index.add("product", i, name)
+        return index
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from product.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating aggregates of every product from its reviews."
+
+    def handle(self, *args, **options):
+        updated = Product.objects.rebuild_ratings()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {updated} products"))
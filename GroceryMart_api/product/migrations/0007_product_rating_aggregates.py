@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:25
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model("product", "Product")
+    Review = apps.get_model("product", "Review")
+    reviews = Review.objects.filter(product=OuterRef("pk")).values("product")
+    rating_count = Coalesce(Subquery(reviews.annotate(c=Count("id")).values("c")), 0)
+    rating_sum = Coalesce(Subquery(reviews.annotate(s=Sum("rating")).values("s")), 0)
+    Product.objects.update(
+        rating_count=rating_count,
+        rating_sum=rating_sum,
+        rating=Coalesce(
+            Cast(rating_sum, FloatField()) / NullIf(rating_count, 0),
+            Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0006_alter_product_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating",
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
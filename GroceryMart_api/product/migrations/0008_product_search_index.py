@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:27
+
+from django.db import migrations
+
+
+VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    """Creates the full-text index for the database in use and fills it from existing products."""
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE product_search USING fts5(name, description, prefix='2 3')"
+        )
+        schema_editor.execute(
+            "INSERT INTO product_search (rowid, name, description) "
+            "SELECT id, name, description FROM product_product"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE product_product ADD COLUMN search_vector tsvector")
+        schema_editor.execute(f"UPDATE product_product SET search_vector = {VECTOR_SQL}")
+        schema_editor.execute(
+            "CREATE INDEX product_search_vector_gin ON product_product USING gin (search_vector)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS product_search")
+    elif vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE product_product DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0007_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
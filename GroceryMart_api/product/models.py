@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import Count, F, FloatField, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.contrib.auth.models import User
+from django.utils import timezone
 from mptt.models import MPTTModel, TreeForeignKey
 from cloudinary.models import CloudinaryField
 
@@ -14,6 +17,12 @@ class Category(MPTTModel):
     class MPTTMeta:
         order_insertion_by = ["name"]
 
+    class Meta:
+        indexes = [
+            # subtree lookups: tree_id = x AND lft BETWEEN a AND b
+            models.Index(fields=["tree_id", "lft", "rght"], name="category_tree_range_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -29,12 +38,57 @@ class Brand(models.Model):
         return self.name
 
 
+def rating_expression(rating_sum, rating_count):
+    """SQL expression for the average rating, 0 when there are no reviews."""
+    return Coalesce(
+        Cast(rating_sum, FloatField()) / NullIf(rating_count, 0),
+        Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_details(self):
+        """Joins brand/category and prefetches reviews with their users."""
+        return self.select_related("brand", "category").prefetch_related(
+            Prefetch("reviews", queryset=Review.objects.select_related("user"))
+        )
+
+    def adjust_rating(self, count_delta, sum_delta):
+        """Applies a review change to the stored rating aggregates in a single UPDATE."""
+        rating_count = F("rating_count") + count_delta
+        rating_sum = F("rating_sum") + sum_delta
+        return self.update(
+            rating_count=rating_count,
+            rating_sum=rating_sum,
+            rating=rating_expression(rating_sum, rating_count),
+            updated_at=timezone.now(),
+        )
+
+    def rebuild_ratings(self):
+        """Recomputes the stored rating aggregates from the reviews in a single UPDATE."""
+        reviews = Review.objects.filter(product=OuterRef("pk")).values("product")
+        rating_count = Coalesce(
+            Subquery(reviews.annotate(c=Count("id")).values("c")), 0
+        )
+        rating_sum = Coalesce(
+            Subquery(reviews.annotate(s=Sum("rating")).values("s")), 0
+        )
+        return self.update(
+            rating_count=rating_count,
+            rating_sum=rating_sum,
+            rating=rating_expression(rating_sum, rating_count),
+            updated_at=timezone.now(),
+        )
+
+
 class Product(models.Model):
     """Product model for grocery items."""
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    reserved = models.PositiveIntegerField(default=0)  # held by carts, see cart/reservations.py
     # image = models.ImageField(upload_to="products/", null=True, blank=True)
     image = CloudinaryField('image', folder='grocerymart_images/products', null=True, blank=True)
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE)
@@ -44,20 +98,34 @@ class Product(models.Model):
     is_digital = models.BooleanField(
         default=False
     )  # digital means does it requires delevery
+    # Denormalized review aggregates, maintained by ReviewViewSet and rebuild_ratings
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating = models.FloatField(default=0)  # average rating, used for ordering/filtering
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # keyset pagination on the sortable columns, with id as tiebreaker
+            models.Index(fields=["created_at", "id"], name="product_created_id_idx"),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["rating", "id"], name="product_rating_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return round(sum(review.rating for review in reviews) / reviews.count(), 1)
-        return 0.0
+        return round(self.rating, 1)
+
+    @property
+    def available(self):
+        """Available-to-promise quantity: stock not held by any cart."""
+        return max(self.stock - self.reserved, 0)
 
 
 class Review(models.Model):
@@ -76,6 +144,22 @@ class Review(models.Model):
     class Meta:
         unique_together = ("product", "user")  # One review per user per product
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="review_created_id_idx"),
+            models.Index(fields=["product", "created_at", "id"], name="review_product_created_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s review for {self.product.name}"
+
+
+class CacheVersion(models.Model):
+    """
+    A version counter of cached data, e.g. the category tree, see product/cache.py. Kept in
+    the database so every process derives the same cache keys and ETags from it.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
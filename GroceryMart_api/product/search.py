@@ -0,0 +1,141 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+
+def search_tokens(query):
+    """Splits a user query into plain word tokens, dropping any search syntax."""
+    return re.findall(r"\w+", query.lower())
+
+
+class ProductSearchBackend:
+    """Fallback backend using icontains, the same behaviour as DRF's SearchFilter."""
+    fields = ["name", "description"]
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, queryset, query):
+        conditions = Q()
+        for token in query.split():
+            token_q = Q()
+            for field in self.fields:
+                token_q |= Q(**{f"{field}__icontains": token})
+            conditions &= token_q
+        return queryset.filter(conditions)
+
+
+class SQLiteFTSBackend(ProductSearchBackend):
+    """SQLite FTS5 backend, the index lives in the product_search virtual table (rowid = product id)."""
+    table = "product_search"
+    weights = (10.0, 1.0)  # bm25 weight for name and description
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)",
+                [product.pk, product.name, product.description],
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table}"
+            )
+
+    def match_expression(self, query):
+        # Every token must match, the last one as a prefix ("org mil" finds "organic milk")
+        tokens = ['"%s"' % token for token in search_tokens(query)]
+        if tokens:
+            tokens[-1] += "*"
+        return " AND ".join(tokens)
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset
+        weights = ", ".join(str(w) for w in self.weights)
+        return queryset.extra(
+            tables=[self.table],
+            where=[f"{self.table}.rowid = {Product._meta.db_table}.id", f"{self.table} MATCH %s"],
+            params=[match],
+            select={"search_rank": f"bm25({self.table}, {weights})"},
+            order_by=["search_rank"],  # bm25 is lower for better matches
+        )
+
+
+class PostgresFTSBackend(ProductSearchBackend):
+    """PostgreSQL backend using the search_vector tsvector column and its GIN index."""
+    config = "simple"
+
+    def vector_sql(self):
+        return (
+            f"setweight(to_tsvector('{self.config}', coalesce(name, '')), 'A') || "
+            f"setweight(to_tsvector('{self.config}', coalesce(description, '')), 'B')"
+        )
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Product._meta.db_table} SET search_vector = {self.vector_sql()} WHERE id = %s",
+                [product.pk],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {Product._meta.db_table} SET search_vector = {self.vector_sql()}")
+
+    def tsquery(self, query):
+        tokens = search_tokens(query)
+        if tokens:
+            tokens[-1] += ":*"
+        return " & ".join(tokens)
+
+    def search(self, queryset, query):
+        tsquery = self.tsquery(query)
+        if not tsquery:
+            return queryset
+        table = Product._meta.db_table
+        return queryset.extra(
+            where=[f"{table}.search_vector @@ to_tsquery('{self.config}', %s)"],
+            params=[tsquery],
+            select={"search_rank": f"ts_rank({table}.search_vector, to_tsquery('{self.config}', %s))"},
+            select_params=[tsquery],
+            order_by=["-search_rank"],
+        )
+
+
+VENDOR_BACKENDS = {
+    "sqlite": SQLiteFTSBackend,
+    "postgresql": PostgresFTSBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Returns the configured search backend (PRODUCT_SEARCH_BACKEND) or the one for the database vendor."""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "PRODUCT_SEARCH_BACKEND", None)
+        backend_class = import_string(path) if path else VENDOR_BACKENDS.get(connection.vendor, ProductSearchBackend)
+        _backend = backend_class()
+    return _backend
@@ -2,25 +2,39 @@ from rest_framework import serializers
 
 from .models import Category, Brand, Product, Review
 from accounts.serializers import UserSerializer
+from GroceryMart_api.serializers import DynamicFieldsMixin
 
 from drf_spectacular.utils import extend_schema_field
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for categories."""
     class Meta:
         model = Category
         fields = "__all__"
 
 
-class BrandSerializer(serializers.ModelSerializer):
+class CategoryTreeSerializer(serializers.ModelSerializer):
+    """Serializer for a category with its nested subcategories, expects get_cached_trees() nodes."""
+    children = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = ["id", "name", "slug", "children"]
+
+    @extend_schema_field(serializers.ListField(child=serializers.DictField()))
+    def get_children(self, obj):
+        return CategoryTreeSerializer(obj.get_children(), many=True).data
+
+
+class BrandSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for brands."""
     class Meta:
         model = Brand
         fields = "__all__"
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for product reviews."""
     user = UserSerializer(read_only=True)
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
@@ -45,21 +59,37 @@ class ReviewSerializer(serializers.ModelSerializer):
         return data
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for products, including nested brand, category, and reviews."""
     brand = BrandSerializer()
     category = CategorySerializer()
     reviews = ReviewSerializer(many=True, read_only=True)
     average_rating = serializers.SerializerMethodField()
+    available = serializers.IntegerField(read_only=True)  # stock minus cart holds
 
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'description', 'price', 'stock', 'image', 'brand',
-            'category', 'is_digital', 'created_at', 'updated_at', 'reviews', 'average_rating'
+            'id', 'name', 'description', 'price', 'stock', 'available', 'image', 'brand',
+            'category', 'is_digital', 'created_at', 'updated_at', 'reviews', 'average_rating',
+            'rating_count'
         ]
+        read_only_fields = ['rating_count']
 
     @extend_schema_field(serializers.FloatField)
     def get_average_rating(self, obj): # obj is the Product instance
         return obj.average_rating()
 
+
+class ProductCardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Compact product representation for grids and nested product references."""
+    average_rating = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'price', 'image', 'average_rating']
+
+    @extend_schema_field(serializers.FloatField)
+    def get_average_rating(self, obj):
+        return obj.average_rating()
+
@@ -0,0 +1,62 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Brand, Category, Product, Review
+from .search import get_search_backend
+from .suggest import update_suggest_index
+from .tree import bump_category_tree_version
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    """Keeps the full-text search index in sync with the product."""
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
+
+
+SUGGEST_KINDS = {Category: "category", Brand: "brand", Product: "product"}
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Product)
+def update_suggestions(sender, instance, **kwargs):
+    """Updates the in-memory typeahead index once the change is committed."""
+    transaction.on_commit(partial(update_suggest_index, SUGGEST_KINDS[sender], instance.pk, instance.name))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Product)
+def remove_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(partial(update_suggest_index, SUGGEST_KINDS[sender], instance.pk))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """Any category change can shift lft/rght values across its tree."""
+    transaction.on_commit(bump_category_tree_version)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_catalog_responses(sender, **kwargs):
+    """Drops every cached catalog response, reviews count too as they change product ratings."""
+    bump_catalog_version()
+    # Again after commit, a request reading the old rows in between may have cached them under the new version
+    transaction.on_commit(bump_catalog_version)
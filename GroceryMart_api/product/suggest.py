@@ -0,0 +1,152 @@
+import heapq
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Brand, Category, Product
+from .search import search_tokens
+
+
+KINDS = ("category", "brand", "product")  # also the ranking order between equally good matches
+MODELS = {"category": Category, "brand": Brand, "product": Product}
+
+
+class PrefixIndex:
+    """
+    In-memory typeahead index over category, brand and product names.
+
+    Distinct name tokens are kept in a sorted list and looked up with bisect, each token
+    maps to a compact array of refs (id * 4 + kind). Display names are stored once per
+    kind in an {id: name} dict. That is about 90 bytes per name plus the name string itself
+    (see the benchmark_suggest command).
+    """
+    scan_limit = 200  # max candidate refs looked at per query, keeps lookups sub-millisecond
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tokens = []
+        self._postings = {}
+        self._names = {kind: {} for kind in KINDS}
+
+    def __len__(self):
+        return sum(len(names) for names in self._names.values())
+
+    def add(self, kind, obj_id, name):
+        with self._lock:
+            self.remove(kind, obj_id)
+            self._names[kind][obj_id] = name
+            ref = obj_id * 4 + KINDS.index(kind)
+            for token in set(search_tokens(name)):
+                postings = self._postings.get(token)
+                if postings is None:
+                    insort(self._tokens, token)
+                    postings = self._postings[token] = array("q")
+                postings.append(ref)
+
+    def remove(self, kind, obj_id):
+        with self._lock:
+            name = self._names[kind].pop(obj_id, None)
+            if name is None:
+                return
+            ref = obj_id * 4 + KINDS.index(kind)
+            for token in set(search_tokens(name)):
+                postings = self._postings[token]
+                postings.remove(ref)
+                if not postings:
+                    del self._postings[token]
+                    del self._tokens[bisect_left(self._tokens, token)]
+
+    def _token_range(self, prefix):
+        lo = bisect_left(self._tokens, prefix)
+        return lo, bisect_left(self._tokens, prefix + "\uffff", lo)
+
+    def suggest(self, query, limit=10):
+        """Returns up to `limit` (kind, id, name) tuples whose words start with the query words."""
+        words = search_tokens(query)
+        if not words:
+            return []
+        phrase = " ".join(words)
+        candidates = {}
+        with self._lock:
+            # Drive the lookup from the most selective word (fewest matching tokens)
+            ranges = {word: self._token_range(word) for word in words}
+            driver = min(words, key=lambda w: (ranges[w][1] - ranges[w][0], -len(w)))
+            for i in range(*ranges[driver]):
+                for ref in islice(self._postings[self._tokens[i]], self.scan_limit - len(candidates)):
+                    kind = KINDS[ref & 3]
+                    candidates[ref] = (kind, ref >> 2, self._names[kind][ref >> 2])
+                if len(candidates) >= self.scan_limit:
+                    break
+
+        others = [re.compile(r"\b" + re.escape(w)) for w in words if w != driver]
+        scored = []
+        for ref, (kind, obj_id, name) in candidates.items():
+            lowered = name.lower()
+            if others and not all(p.search(lowered) for p in others):
+                continue
+            # names starting with the query first, then by kind, then shorter names
+            scored.append(((not lowered.startswith(phrase), ref & 3, len(name), lowered), kind, obj_id, name))
+        return [(kind, obj_id, name) for _, kind, obj_id, name in heapq.nsmallest(limit, scored)]
+
+    @classmethod
+    def from_database(cls):
+        index = cls()
+        for kind, model in MODELS.items():
+            for obj_id, name in model.objects.order_by().values_list("id", "name").iterator(chunk_size=5000):
+                index.add(kind, obj_id, name)
+        return index
+
+
+_index = None
+_built_at = 0.0
+_rebuilding = threading.Lock()
+
+
+def _rebuild():
+    global _index, _built_at
+    try:
+        index = PrefixIndex.from_database()
+        _index, _built_at = index, time.monotonic()
+    finally:
+        connection.close()  # the thread's own connection
+        _rebuilding.release()
+
+
+def get_suggest_index():
+    """
+    Returns the process-wide index, building it on first use.
+
+    Signals only reach the process that made the change, so an index older than
+    SUGGEST_INDEX_MAX_AGE seconds is rebuilt in a background thread while the
+    current one keeps serving.
+    """
+    global _index, _built_at
+    if _index is None:
+        with _rebuilding:
+            if _index is None:
+                _index, _built_at = PrefixIndex.from_database(), time.monotonic()
+    elif time.monotonic() - _built_at > getattr(settings, "SUGGEST_INDEX_MAX_AGE", 300):
+        if _rebuilding.acquire(blocking=False):
+            threading.Thread(target=_rebuild, daemon=True).start()
+    return _index
+
+
+def update_suggest_index(kind, obj_id, name=None):
+    """Applies a single change to the loaded index, name=None removes the entry."""
+    if _index is None:
+        return  # nothing loaded yet, the first build will read the change from the database
+    if name is None:
+        _index.remove(kind, obj_id)
+    else:
+        _index.add(kind, obj_id, name)
+
+
+def reset_suggest_index():
+    global _index
+    _index = None
@@ -1,3 +1,406 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from GroceryMart_api.cache_backends import LocMemLRUBackend
+
+from .cache import CATALOG_VERSION_KEY, bump_version, get_response_cache
+from .inventory import InsufficientStock, take_stock
+from .models import CacheVersion, Category, Brand, Product, Review
+from .suggest import PrefixIndex, reset_suggest_index
+from .tree import VERSION_KEY, category_tree_version
+from accounts.models import Profile
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+
+
+class ProductQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.brand = Brand.objects.create(name="Test Brand")
+        self.category = Category.objects.create(name="Test Category", slug="test-category")
+        self.users = [User.objects.create_user(username=f"reviewer{i}") for i in range(3)]
+
+    def create_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f"Product {i}", price=10, stock=5, brand=self.brand, category=self.category
+            )
+            for rating, user in enumerate(self.users, start=3):
+                Review.objects.create(product=product, user=user, rating=rating)
+        Product.objects.rebuild_ratings()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_list_query_count_is_constant(self):
+        self.create_products(2)
+        small, _ = self.count_queries("/products/")
+        self.create_products(8)
+        large, response = self.count_queries("/products/")
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_detail_query_count_is_constant(self):
+        self.create_products(1)
+        product = Product.objects.get()
+        small, _ = self.count_queries(f"/products/{product.id}/")
+        for i in range(5):
+            user = User.objects.create_user(username=f"extra{i}")
+            Review.objects.create(product=product, user=user, rating=5)
+        Product.objects.rebuild_ratings()
+        large, _ = self.count_queries(f"/products/{product.id}/")
+        self.assertEqual(small, large)
+
+    def test_average_rating_uses_stored_aggregate(self):
+        self.create_products(1)
+        _, response = self.count_queries("/products/")
+        self.assertEqual(response.data["results"][0]["average_rating"], 4.0)
+        self.assertEqual(len(response.data["results"][0]["reviews"]), 3)
+
+
+class ProductRatingAggregateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="buyer", password="testpass")
+        self.client.force_authenticate(user=self.user)
+        self.brand = Brand.objects.create(name="Test Brand")
+        self.product = Product.objects.create(name="Milk", price=10, stock=5, brand=self.brand)
+        self.other = Product.objects.create(name="Bread", price=5, stock=5, brand=self.brand)
+        order = Order.objects.create(user=self.user, total=15, status="paid")
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=10)
+        OrderItem.objects.create(order=order, product=self.other, quantity=1, price=5)
+
+    def assertRating(self, product, count, total, rating):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum, product.rating), (count, total, rating))
+
+    def test_review_create_update_delete_maintains_aggregates(self):
+        response = self.client.post("/products/reviews/", {"product": self.product.id, "rating": 4})
+        self.assertEqual(response.status_code, 201)
+        self.assertRating(self.product, 1, 4, 4.0)
+
+        review_id = response.data["id"]
+        response = self.client.patch(f"/products/reviews/{review_id}/", {"rating": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertRating(self.product, 1, 2, 2.0)
+
+        response = self.client.patch(f"/products/reviews/{review_id}/", {"product": self.other.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertRating(self.product, 0, 0, 0.0)
+        self.assertRating(self.other, 1, 2, 2.0)
+
+        response = self.client.delete(f"/products/reviews/{review_id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertRating(self.other, 0, 0, 0.0)
+
+    def test_min_rating_filter_and_rating_ordering(self):
+        Review.objects.create(product=self.product, user=self.user, rating=5)
+        Review.objects.create(product=self.other, user=self.user, rating=3)
+        Product.objects.rebuild_ratings()
+
+        response = self.client.get("/products/", {"min_rating": 4})
+        self.assertEqual([p["id"] for p in response.data["results"]], [self.product.id])
+        response = self.client.get("/products/", {"ordering": "rating"})
+        self.assertEqual([p["id"] for p in response.data["results"]], [self.other.id, self.product.id])
+
+    def test_rebuild_ratings_command(self):
+        Review.objects.create(product=self.product, user=self.user, rating=5)
+        Review.objects.create(product=self.product, user=User.objects.create_user(username="x"), rating=2)
+        call_command("rebuild_ratings", stdout=StringIO())
+        self.assertRating(self.product, 2, 7, 3.5)
+        self.assertRating(self.other, 0, 0, 0.0)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.brand = Brand.objects.create(name="Test Brand")
+        self.milk = Product.objects.create(
+            name="Organic Milk", description="Fresh from the farm", price=3, brand=self.brand
+        )
+        self.butter = Product.objects.create(
+            name="Butter", description="Churned from organic milk", price=5, brand=self.brand
+        )
+        self.rice = Product.objects.create(name="Basmati Rice", price=8, brand=self.brand)
+
+    def search(self, term):
+        response = self.client.get("/products/", {"search": term})
+        self.assertEqual(response.status_code, 200)
+        return [p["id"] for p in response.data["results"]]
+
+    def test_results_are_ranked_by_relevance(self):
+        self.assertEqual(self.search("milk"), [self.milk.id, self.butter.id])
+
+    def test_all_terms_must_match_and_last_term_is_a_prefix(self):
+        self.assertEqual(self.search("organic mil"), [self.milk.id, self.butter.id])
+        self.assertEqual(self.search("basmati ric"), [self.rice.id])
+        self.assertEqual(self.search("basmati milk"), [])
+
+    def test_index_follows_product_changes(self):
+        self.rice.name = "Jasmine Rice"
+        self.rice.save()
+        self.assertEqual(self.search("jasmine"), [self.rice.id])
+        self.assertEqual(self.search("basmati"), [])
+        self.milk.delete()
+        self.assertEqual(self.search("milk"), [self.butter.id])
+
+
+class ProductSuggestTests(TestCase):
+    def setUp(self):
+        reset_suggest_index()
+        self.client = APIClient()
+        self.brand = Brand.objects.create(name="Milk Vita")
+        self.category = Category.objects.create(name="Milk & Dairy", slug="milk-dairy")
+        self.milk = Product.objects.create(name="Organic Milk", price=3, brand=self.brand)
+        self.powder = Product.objects.create(name="Milk Powder", price=9, brand=self.brand)
+
+    def tearDown(self):
+        reset_suggest_index()
+
+    def suggest(self, q):
+        response = self.client.get("/products/suggest/", {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return [(s["type"], s["id"]) for s in response.data["results"]]
+
+    def test_suggestions_match_word_prefixes(self):
+        self.assertEqual(self.suggest("mil"), [
+            ("category", self.category.id),
+            ("brand", self.brand.id),
+            ("product", self.powder.id),
+            ("product", self.milk.id),
+        ])
+        self.assertEqual(self.suggest("org mi"), [("product", self.milk.id)])
+        self.assertEqual(self.suggest(""), [])
+
+    def test_index_follows_changes(self):
+        self.suggest("mil")  # load the index
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk.name = "Organic Yogurt"
+            self.milk.save()
+            self.powder.delete()
+        self.assertEqual(self.suggest("yog"), [("product", self.milk.id)])
+        self.assertNotIn(("product", self.powder.id), self.suggest("milk"))
+
+    def test_prefix_index_add_remove(self):
+        index = PrefixIndex()
+        index.add("product", 1, "Basmati Rice")
+        index.add("product", 2, "Brown Rice")
+        index.add("product", 1, "Jasmine Rice")
+        self.assertEqual(index.suggest("bas"), [])
+        self.assertEqual(index.suggest("rice"), [("product", 2, "Brown Rice"), ("product", 1, "Jasmine Rice")])
+        index.remove("product", 2)
+        self.assertEqual(index.suggest("br"), [])
+        self.assertEqual(len(index), 1)
+
+
+class CategoryTreeFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        brand = Brand.objects.create(name="Test Brand")
+        self.dairy = Category.objects.create(name="Dairy", slug="dairy")
+        self.milk = Category.objects.create(name="Milk", slug="milk", parent=self.dairy)
+        self.skim = Category.objects.create(name="Skim", slug="skim", parent=self.milk)
+        self.bakery = Category.objects.create(name="Bakery", slug="bakery")
+        self.products = {
+            category.slug: Product.objects.create(name=category.name, price=1, brand=brand, category=category)
+            for category in [self.dairy, self.milk, self.skim, self.bakery]
+        }
+
+    def listed(self, category_id):
+        response = self.client.get("/products/", {"category_tree": category_id})
+        self.assertEqual(response.status_code, 200)
+        return {p["id"] for p in response.data["results"]}
+
+    def test_subtree_includes_descendants(self):
+        ids = {slug: p.id for slug, p in self.products.items()}
+        self.assertEqual(self.listed(self.dairy.id), {ids["dairy"], ids["milk"], ids["skim"]})
+        self.assertEqual(self.listed(self.milk.id), {ids["milk"], ids["skim"]})
+        self.assertEqual(self.listed(self.bakery.id), {ids["bakery"]})
+        self.assertEqual(self.listed(999), set())
+
+    def test_bounds_are_cached_until_a_category_changes(self):
+        self.listed(self.dairy.id)
+        with CaptureQueriesContext(connection) as flat:
+            self.client.get("/products/", {"category": self.dairy.id})
+        with CaptureQueriesContext(connection) as subtree:
+            self.listed(self.dairy.id)
+        self.assertLessEqual(len(subtree.captured_queries), len(flat.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cheese = Category.objects.create(name="Cheese", slug="cheese", parent=self.dairy)
+        product = Product.objects.create(name="Cheddar", price=1, brand=self.products["dairy"].brand, category=cheese)
+        self.assertIn(product.id, self.listed(self.dairy.id))
+
+    def test_bounds_follow_category_moves_made_by_other_processes(self):
+        version = category_tree_version()
+        self.assertIn(self.products["skim"].id, self.listed(self.milk.id))
+
+        # another process moves Skim under Bakery, here only the stored version tells
+        Category.objects.get(pk=self.skim.pk).move_to(Category.objects.get(pk=self.bakery.pk))
+        CacheVersion.objects.update_or_create(key=VERSION_KEY, defaults={"value": version + 1})
+        cache.delete(VERSION_KEY)  # CACHE_VERSION_MAX_AGE passed
+        bump_version(CATALOG_VERSION_KEY)  # the listing is cached too
+        self.assertEqual(category_tree_version(), version + 1)
+        self.assertNotIn(self.products["skim"].id, self.listed(self.milk.id))
+        self.assertIn(self.products["skim"].id, self.listed(self.bakery.id))
+
+
+class CategoryTreeEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.dairy = Category.objects.create(name="Dairy", slug="dairy")
+        self.milk = Category.objects.create(name="Milk", slug="milk", parent=self.dairy)
+        self.bakery = Category.objects.create(name="Bakery", slug="bakery")
+
+    def test_tree_is_nested_and_cached(self):
+        with self.assertNumQueries(2):  # the stored tree version, the categories
+            response = self.client.get("/products/categories/tree/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["slug"] for c in response.data], ["bakery", "dairy"])
+        self.assertEqual(response.data[1]["children"][0]["slug"], "milk")
+        self.assertEqual(response.data[1]["children"][0]["children"], [])
+        with self.assertNumQueries(0):
+            self.client.get("/products/categories/tree/")
+
+    def test_if_none_match_and_invalidation(self):
+        etag = self.client.get("/products/categories/tree/")["ETag"]
+        response = self.client.get("/products/categories/tree/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Cheese", slug="cheese", parent=self.dairy)
+        response = self.client.get("/products/categories/tree/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data[1]["children"]), 2)
+
+    def test_changes_made_by_other_processes_are_served(self):
+        etag = self.client.get("/products/categories/tree/")["ETag"]
+        # another process renames Milk, here only the stored version tells
+        Category.objects.filter(pk=self.milk.pk).update(name="Whole milk")
+        CacheVersion.objects.update_or_create(key=VERSION_KEY, defaults={"value": category_tree_version() + 1})
+        self.assertEqual(self.client.get("/products/categories/tree/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        cache.delete(VERSION_KEY)  # CACHE_VERSION_MAX_AGE passed
+        response = self.client.get("/products/categories/tree/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[1]["children"][0]["name"], "Whole milk")
+
+
+class CatalogResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.brand = Brand.objects.create(name="Test Brand")
+        self.product = Product.objects.create(name="Milk", price=10, brand=self.brand)
+
+    def test_anonymous_reads_are_served_from_cache(self):
+        first = self.client.get("/products/", {"ordering": "price", "min_price": 1})
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client.get("/products/", {"min_price": 1, "ordering": "price"})
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.client.get(f"/products/{self.product.id}/")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get("/products/brands/")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get("/products/brands/")["X-Cache"], "HIT")
+        stats = get_response_cache().stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 3))
+
+    def test_catalog_changes_invalidate(self):
+        self.client.get(f"/products/{self.product.id}/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Oat Milk"
+            self.product.save()
+        response = self.client.get(f"/products/{self.product.id}/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["name"], "Oat Milk")
+
+        self.client.get("/products/")
+        Review.objects.create(product=self.product, user=User.objects.create_user(username="buyer"), rating=4)
+        self.assertEqual(self.client.get("/products/")["X-Cache"], "MISS")
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_authenticate(user=User.objects.create_user(username="buyer"))
+        self.client.get("/products/")
+        response = self.client.get("/products/")
+        self.assertNotIn("X-Cache", response)
+        self.assertEqual(get_response_cache().stats()["hits"], 0)
+
+    def test_lru_evicts_least_recently_used(self):
+        backend = LocMemLRUBackend(max_entries=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")
+        backend.set("c", 3)
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual((backend.get("a"), backend.get("c")), (1, 3))
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        brand = Brand.objects.create(name="Test Brand")
+        self.milk = Product.objects.create(name="Milk", price=2, stock=5, reserved=2, brand=brand)
+        self.bread = Product.objects.create(name="Bread", price=1, stock=3, brand=brand)
+
+    def test_take_stock_respects_holds_of_others(self):
+        take_stock({self.milk.id: 3, self.bread.id: 1})
+        with self.assertRaises(InsufficientStock) as ctx:
+            take_stock({self.bread.id: 1, self.milk.id: 1})
+        self.assertEqual(ctx.exception.available, 0)
+        take_stock({self.milk.id: 2}, held={self.milk.id: 2})  # the buyer's own hold
+        self.milk.refresh_from_db()
+        self.bread.refresh_from_db()
+        self.assertEqual((self.milk.stock, self.milk.reserved, self.bread.stock), (0, 0, 2))
+
+    def test_failed_checkout_rolls_back_every_write(self):
+        user = User.objects.create_user(username="buyer")
+        Profile.objects.create(user=user, full_name="Buyer", phone="1", address="Street", balance=100)
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.bread, quantity=1)
+        CartItem.objects.create(cart=cart, product=self.milk, quantity=4)  # only 3 are free
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post("/orders/checkout/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["message"], "Only 3 units of Milk available")
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.assertEqual(Profile.objects.get(user=user).balance, 100)
+        self.bread.refresh_from_db()
+        self.assertEqual(self.bread.stock, 3)
+
+    def test_checkout_query_count_does_not_grow_with_the_basket(self):
+        brand = Brand.objects.get()
+        extra = Product.objects.bulk_create([
+            Product(name=f"Item {i}", price=1, stock=10, brand=brand) for i in range(12)
+        ])
+
+        def checkout(username, products):
+            user = User.objects.create_user(username=username)
+            Profile.objects.create(user=user, full_name=username, phone="1", address="Street", balance=100)
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=1) for product in products])
+            client = APIClient()
+            client.force_authenticate(user=user)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post("/orders/checkout/")
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
 
-# Create your tests here.
+        self.assertEqual(checkout("small", [self.bread]), checkout("large", extra))
+        self.assertEqual(OrderItem.objects.count(), 13)
+        self.assertEqual(sorted(Product.objects.filter(pk__in=[p.pk for p in extra]).values_list("stock", flat=True)), [9] * 12)
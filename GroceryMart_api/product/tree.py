@@ -0,0 +1,64 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from .cache import bump_version, get_version
+from .models import Category
+from .serializers import CategoryTreeSerializer
+
+
+VERSION_KEY = "product:category-tree-version"
+
+_bounds = (None, {})  # (version, bounds) memoized in the process
+_tree = (None, None, [])  # (version, etag, data)
+
+
+def category_tree_version():
+    """Version of the category tree, bumped whenever a category changes, the same in every process."""
+    return get_version(VERSION_KEY)
+
+
+def bump_category_tree_version():
+    bump_version(VERSION_KEY)
+
+
+def category_bounds():
+    """Returns {category_id: (tree_id, lft, rght)} for every category, loaded once per tree version."""
+    global _bounds
+    version = category_tree_version()
+    if _bounds[0] != version:
+        key = f"product:category-bounds:{version}"
+        bounds = cache.get(key)
+        if bounds is None:
+            bounds = {
+                pk: (tree_id, lft, rght)
+                for pk, tree_id, lft, rght in Category.objects.values_list("id", "tree_id", "lft", "rght")
+            }
+            cache.set(key, bounds, None)
+        _bounds = (version, bounds)
+    return _bounds[1]
+
+
+def category_tree():
+    """
+    Returns (etag, data) for the whole nested category tree.
+
+    The tree is loaded in one query, serialized once per tree version and shared
+    through the cache, each process also keeps the current version in memory. The
+    version is stored in the database ( see product/cache.py ), so a change made by
+    another process is served here after CACHE_VERSION_MAX_AGE seconds at the latest.
+    """
+    global _tree
+    version = category_tree_version()
+    if _tree[0] != version:
+        key = f"product:category-tree:{version}"
+        cached = cache.get(key)
+        if cached is None:
+            roots = Category.objects.all().get_cached_trees()
+            data = CategoryTreeSerializer(roots, many=True).data
+            etag = hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
+            cached = (f'"{etag}"', data)
+            cache.set(key, cached, None)
+        _tree = (version, *cached)
+    return _tree[1], _tree[2]
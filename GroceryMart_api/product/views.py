@@ -1,13 +1,22 @@
 from django.shortcuts import render
+from django.db import transaction
 from rest_framework import viewsets, filters, serializers
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticatedOrReadOnly
 from .models import Category, Brand, Product, Review
-from .serializers import CategorySerializer, BrandSerializer, ProductSerializer, ReviewSerializer
+from .serializers import CategorySerializer, CategoryTreeSerializer, BrandSerializer, ProductSerializer, ReviewSerializer
 
 from django_filters.rest_framework import DjangoFilterBackend
-from .filters import ProductFilter
+from .cache import CatalogCacheMixin, catalog_version, get_response_cache
+from .filters import ProductFilter, ProductSearchFilter
 from .permissions import IsPurchaserOrReadOnly
+from .suggest import get_suggest_index
+from .tree import category_tree
+from GroceryMart_api.conditional import ConditionalGetMixin
+from GroceryMart_api.pagination import KeysetPagination
+from GroceryMart_api.serializers import field_requested
 
 from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResponse, OpenApiParameter
 
@@ -15,7 +24,7 @@ from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResp
     list=extend_schema(summary="List categories", tags=['Products']),
     retrieve=extend_schema(summary="Retrieve category", tags=['Products']),
 )
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     get:
     Retrieve a list of categories or a single category.
@@ -23,12 +32,26 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+    @extend_schema(
+        summary="Category tree",
+        description="The whole category hierarchy with nested children. Supports If-None-Match.",
+        responses={200: CategoryTreeSerializer(many=True), 304: OpenApiResponse(description="Not modified")},
+        tags=['Products'],
+    )
+    @action(detail=False, methods=['get'], pagination_class=None, filter_backends=[])
+    def tree(self, request):
+        etag, data = category_tree()
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}  # clients revalidate with If-None-Match
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(data, headers=headers)
+
 
 @extend_schema_view(
     list=extend_schema(summary="List of brands", tags=['Products']),
     retrieve=extend_schema(summary="Retrieve brand", tags=['Products']),
 )
-class BrandViewSet(viewsets.ReadOnlyModelViewSet):
+class BrandViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
 
@@ -41,9 +64,12 @@ class BrandViewSet(viewsets.ReadOnlyModelViewSet):
             OpenApiParameter(name='search', description='Search by name or description', type=str),
             OpenApiParameter(name='brand', description='Filter by brand ID', type=int),
             OpenApiParameter(name='category', description='Filter by category ID', type=int),
+            OpenApiParameter(name='category_tree', description='Filter by category ID including its subcategories', type=int),
             OpenApiParameter(name='min_price', description='Minimum price', type=float),
             OpenApiParameter(name='max_price', description='Maximum price', type=float),
-            OpenApiParameter(name='ordering', description='Order by price or created_at (prefix - for descending)', type=str),
+            OpenApiParameter(name='min_rating', description='Minimum average rating', type=float),
+            OpenApiParameter(name='ordering', description='Order by price, created_at or rating (prefix - for descending)', type=str),
+            OpenApiParameter(name='fields', description='Comma separated fields to return, e.g. id,name,price,image,average_rating', type=str),
         ],
         tags=['Products']
     ),
@@ -53,18 +79,70 @@ class BrandViewSet(viewsets.ReadOnlyModelViewSet):
     partial_update=extend_schema(summary="Partially update product", tags=['Products']),
     destroy=extend_schema(summary="Delete product", tags=['Products']),
 )
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+class ProductViewSet(ConditionalGetMixin, CatalogCacheMixin, viewsets.ModelViewSet):
+    """
+    Anonymous list/retrieve responses are cached per catalog version, see product/cache.py.
+    Product details also answer If-None-Match / If-Modified-Since.
+    """
+    queryset = Product.objects.with_details()  # constant number of queries per page
     serializer_class = ProductSerializer
+    pagination_class = KeysetPagination  # ?page=2 or ?cursor= for keyset pages
 
     filter_backends = [
-        filters.SearchFilter,
+        ProductSearchFilter,
         DjangoFilterBackend,
         filters.OrderingFilter,
     ]
-    search_fields = ["name", "description"]  # ?search=milk
-    filterset_class = ProductFilter  # ?brand=1&category=2 / ?min_price=10&max_price=50
-    ordering_fields = ["price", "created_at"]  # ?ordering=price / ?ordering=-created_at ( use - sign for decending ordering )
+    search_fields = ["name", "description"]  # ?search=milk ( full-text, see product/search.py )
+    filterset_class = ProductFilter  # ?brand=1&category=2 / ?min_price=10&max_price=50 / ?min_rating=4
+    ordering_fields = ["price", "created_at", "rating"]  # ?ordering=price / ?ordering=-created_at ( use - sign for decending ordering )
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        if self.action != "retrieve" or not str(kwargs.get("pk", "")).isdigit():
+            return None
+        updated_at = Product.objects.filter(pk=kwargs["pk"]).values_list("updated_at", flat=True).first()
+        if updated_at is None:
+            return None  # let retrieve() answer the 404
+        # the catalog version, stored in the database, covers the nested brand, category and reviews
+        return (updated_at, catalog_version()), updated_at
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not field_requested(self.request, "reviews"):
+            queryset = queryset.prefetch_related(None)  # ?fields= without reviews, skip their query
+        return queryset
+
+    @extend_schema(
+        summary="Typeahead suggestions",
+        description="Product, brand and category names whose words start with the query words, served from an in-memory index.",
+        parameters=[
+            OpenApiParameter(name='q', description='Text typed so far', type=str, required=True),
+            OpenApiParameter(name='limit', description='Maximum number of suggestions (default 10, max 50)', type=int),
+        ],
+        responses={200: OpenApiResponse(description="List of {type, id, name} suggestions")},
+        tags=['Products'],
+    )
+    @action(detail=False, methods=['get'], pagination_class=None, filter_backends=[])
+    def suggest(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        suggestions = get_suggest_index().suggest(query, limit)
+        return Response({
+            "results": [{"type": kind, "id": obj_id, "name": name} for kind, obj_id, name in suggestions]
+        })
+
+    @extend_schema(
+        summary="Catalog cache statistics (admin only)",
+        responses={200: OpenApiResponse(description="Backend name with hit and miss counters of this process")},
+        tags=['Products'],
+    )
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser],
+            pagination_class=None, filter_backends=[])
+    def cache_stats(self, request):
+        return Response(get_response_cache().stats())
 
     
 @extend_schema_view(
@@ -83,6 +161,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsPurchaserOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         # Optionally filter reviews by product
@@ -91,18 +170,30 @@ class ReviewViewSet(viewsets.ModelViewSet):
             return self.queryset.filter(product_id=product_id)
         return self.queryset
 
+    # The product's stored rating aggregates are updated in the same transaction as the review.
     def perform_create(self, serializer):
         # Overrides create to auto-set user to request.user; ensures user isn't set manually.
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            review = serializer.save(user=self.request.user)
+            Product.objects.filter(pk=review.product_id).adjust_rating(1, review.rating)
 
     def perform_update(self, serializer):
         # Ensure only the review owner can update
         if self.get_object().user != self.request.user:
             raise serializers.ValidationError("You can only edit your own reviews.")
-        serializer.save()
+        with transaction.atomic():
+            old = Review.objects.select_for_update().get(pk=serializer.instance.pk)
+            review = serializer.save()
+            if review.product_id != old.product_id:
+                Product.objects.filter(pk=old.product_id).adjust_rating(-1, -old.rating)
+                Product.objects.filter(pk=review.product_id).adjust_rating(1, review.rating)
+            elif review.rating != old.rating:
+                Product.objects.filter(pk=review.product_id).adjust_rating(0, review.rating - old.rating)
 
     def perform_destroy(self, obj):
         # Ensure only the review owner can delete
         if obj.user != self.request.user:
             raise serializers.ValidationError("You can only delete your own reviews.")
-        obj.delete()
\ No newline at end of file
+        with transaction.atomic():
+            obj.delete()
+            Product.objects.filter(pk=obj.product_id).adjust_rating(-1, -obj.rating)
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+Tests for the JWT authentication that loads and caches the user's profile, cart and wishlist with the user.
+"""
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from GroceryMart_api.authentication import get_user_cache
+from accounts.models import Profile
+from cart.models import Cart
+from product.models import Brand, Product
+from wishlist.models import Wishlist
+
+
+class RequestContextAuthenticationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", password="testpass")
+        Profile.objects.create(user=self.user, full_name="Buyer", phone="1", address="Street", balance=100)
+        self.product = Product.objects.create(name="Milk", price=2, stock=5, brand=Brand.objects.create(name="Brand"))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_user_context_is_loaded_once_then_served_from_the_cache(self):
+        self.assertEqual(self.client.post("/wishlist/add/", {"product_id": self.product.id}).status_code, 201)
+        self.assertEqual(Wishlist.objects.count(), 1)  # created on first use, which drops the cached user
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/wishlist/")
+        # the user, profile, cart and wishlist in one query
+        self.assertIn('"accounts_profile"', queries[0]["sql"])
+        self.assertIn('"wishlist_wishlist"', queries[0]["sql"])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post("/wishlist/remove/", {"product_id": self.product.id})
+        self.assertFalse(any('FROM "auth_user"' in q["sql"] or 'FROM "wishlist_wishlist"' in q["sql"] for q in queries))
+
+    def test_user_changes_drop_the_cached_user(self):
+        self.assertEqual(self.client.get("/wishlist/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/wishlist/").status_code, 401)
+
+    def test_users_deactivated_by_another_process_are_locked_out_after_the_timeout(self):
+        self.client.get("/wishlist/")  # creates the wishlist, which drops the cached user
+        self.assertEqual(self.client.get("/wishlist/").status_code, 200)
+        # another process saved the user, its signal dropped only that process's entry
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get("/wishlist/").status_code, 200)
+
+        later = time.monotonic() + get_user_cache().timeout + 1
+        with mock.patch("GroceryMart_api.cache_backends.time.monotonic", return_value=later):
+            self.assertEqual(self.client.get("/wishlist/").status_code, 401)
+
+    def test_checkout_uses_the_profile_loaded_with_the_user(self):
+        cart = Cart.objects.create(user=self.user)
+        cart.items.create(product=self.product, quantity=2)
+        self.client.get("/wishlist/")  # caches the user with its profile and cart
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/orders/checkout/")
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(any('FROM "accounts_profile"' in query["sql"] for query in queries))
+        self.assertFalse(any('FROM "cart_cart"' in query["sql"] for query in queries))
+        self.assertEqual(Profile.objects.get(user=self.user).balance, 96)
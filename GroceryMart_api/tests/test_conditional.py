@@ -0,0 +1,95 @@
+"""
+Tests for ConditionalGetMixin: ETag / Last-Modified on cart, wishlist, orders and product details.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework.test import APITestCase, APIClient
+
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from product.models import Brand, Product
+from wishlist.models import Wishlist, WishlistItem
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="buyer")
+        self.client.force_authenticate(user=self.user)
+        brand = Brand.objects.create(name="Test Brand")
+        self.milk = Product.objects.create(name="Milk", price=10, stock=5, brand=brand)
+        self.bread = Product.objects.create(name="Bread", price=3, stock=5, brand=brand)
+
+    def revalidate(self, url, etag, queries=1):
+        with self.assertNumQueries(queries):
+            return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_cart_not_modified_until_it_changes(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.milk, quantity=1)
+        response = self.client.get("/cart/")
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn("Last-Modified", response)
+
+        response = self.revalidate("/cart/", etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        CartItem.objects.create(cart=cart, product=self.bread, quantity=2)
+        response = self.client.get("/cart/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["items"]), 2)
+
+    def test_cart_follows_product_changes_and_representation(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.milk, quantity=1)
+        etag = self.client.get("/cart/")["ETag"]
+        self.assertNotEqual(self.client.get("/cart/", {"expand": "product"})["ETag"], etag)
+
+        Product.objects.filter(pk=self.milk.pk).adjust_rating(1, 5)
+        self.assertEqual(self.client.get("/cart/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_wishlist(self):
+        wishlist = Wishlist.objects.create(user=self.user)
+        etag = self.client.get("/wishlist/")["ETag"]
+        self.assertEqual(self.revalidate("/wishlist/", etag).status_code, 304)
+        WishlistItem.objects.create(wishlist=wishlist, product=self.milk)
+        self.assertEqual(self.client.get("/wishlist/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_orders_high_water_mark(self):
+        order = Order.objects.create(user=self.user, total=10)
+        OrderItem.objects.create(order=order, product=self.milk, quantity=1, price=10)
+        list_etag = self.client.get("/orders/")["ETag"]
+        detail_etag = self.client.get(f"/orders/{order.id}/")["ETag"]
+        self.assertEqual(self.revalidate("/orders/", list_etag).status_code, 304)
+        self.assertEqual(self.revalidate(f"/orders/{order.id}/", detail_etag).status_code, 304)
+
+        order.status = "paid"
+        order.save()
+        self.assertEqual(self.client.get("/orders/", HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        self.assertEqual(self.client.get(f"/orders/{order.id}/", HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+        self.assertEqual(self.client.get("/orders/999/").status_code, 404)
+
+    def test_product_detail(self):
+        url = f"/products/{self.milk.id}/"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+        self.milk.stock = 4
+        self.milk.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotIn("ETag", self.client.get("/products/"))
+
+    def test_every_process_issues_the_same_etag(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.milk, quantity=1)
+        urls = [f"/products/{self.milk.id}/", "/cart/?expand=product"]
+        etags = [self.client.get(url)["ETag"] for url in urls]
+        cache.clear()  # another process, with its own cache
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
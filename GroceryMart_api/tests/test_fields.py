@@ -0,0 +1,74 @@
+"""
+Tests for the ?fields= / ?expand= support of DynamicFieldsMixin.
+"""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from GroceryMart_api.serializers import parse_fields
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from product.models import Brand, Product, Review
+
+
+class ParseFieldsTest(TestCase):
+    def test_dotted_paths(self):
+        self.assertEqual(
+            parse_fields("id, items.product.name,items.quantity"),
+            {"id": None, "items": {"product": {"name": None}, "quantity": None}},
+        )
+
+    def test_whole_field_wins_over_subfields(self):
+        self.assertEqual(parse_fields("items,items.quantity"), {"items": None})
+        self.assertEqual(parse_fields("items.quantity,items"), {"items": None})
+
+
+class DynamicFieldsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="buyer")
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(
+            name="Milk", description="Fresh", price=3, brand=Brand.objects.create(name="Brand")
+        )
+        Review.objects.create(product=self.product, user=self.user, rating=5)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+
+    def test_product_fields(self):
+        response = self.client.get("/products/", {"fields": "id,name,price"})
+        self.assertEqual(list(response.data["results"][0]), ["id", "name", "price"])
+
+    def test_product_fields_skip_reviews_query(self):
+        with CaptureQueriesContext(connection) as full:
+            self.client.get("/products/")
+        with CaptureQueriesContext(connection) as trimmed:
+            self.client.get("/products/", {"fields": "id,name"})
+        self.assertEqual(len(trimmed.captured_queries), len(full.captured_queries) - 1)
+
+    def test_cart_uses_product_card_by_default(self):
+        response = self.client.get("/cart/")
+        product = response.data["items"][0]["product"]
+        self.assertEqual(set(product), {"id", "name", "price", "image", "average_rating"})
+
+    def test_cart_expand_and_nested_fields(self):
+        response = self.client.get("/cart/", {"expand": "product"})
+        self.assertIn("reviews", response.data["items"][0]["product"])
+
+        response = self.client.get("/cart/", {"fields": "total,items.quantity,items.product.name"})
+        self.assertEqual(set(response.data), {"total", "items"})
+        self.assertEqual(response.data["items"][0], {"product": {"name": "Milk"}, "quantity": 2})
+
+    def test_wishlist_uses_product_card(self):
+        self.client.post("/wishlist/add/", {"product_id": self.product.id})
+        response = self.client.get("/wishlist/")
+        self.assertNotIn("reviews", response.data["results"][0]["product"])
+
+    def test_order_item_expand_product(self):
+        order = Order.objects.create(user=self.user, total=6)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=3)
+        response = self.client.get(f"/orders/{order.id}/", {"expand": "product", "fields": "id,items"})
+        self.assertEqual(set(response.data), {"id", "items"})
+        self.assertEqual(response.data["items"][0]["product"]["name"], "Milk")
@@ -0,0 +1,79 @@
+"""
+Tests for KeysetPagination: cursor walks over products and orders, and the page-number fallback.
+"""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+
+from orders.models import Order
+from product.models import Brand, Product
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        brand = Brand.objects.create(name="Test Brand")
+        # 25 products over 5 prices, so price ordering has plenty of ties
+        self.products = [
+            Product.objects.create(name=f"Product {i}", price=i % 5, brand=brand) for i in range(25)
+        ]
+
+    def walk(self, url, params):
+        ids, pages = [], []
+        response = self.client.get(url, {**params, "cursor": ""})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            ids += [row["id"] for row in response.data["results"]]
+            if not response.data["next"]:
+                return ids, pages
+            response = self.client.get(response.data["next"])
+
+    def test_cursor_walk_matches_full_ordering(self):
+        for ordering, key in [
+            ("-created_at", lambda p: (p.created_at, p.id)),
+            ("price", lambda p: (p.price, p.id)),
+            ("-price", lambda p: (p.price, p.id)),
+        ]:
+            ids, pages = self.walk("/products/", {"ordering": ordering})
+            expected = sorted(self.products, key=key, reverse=ordering.startswith("-"))
+            self.assertEqual(ids, [p.id for p in expected], ordering)
+            self.assertEqual(len(pages), 3)
+            self.assertNotIn("count", pages[0])
+            self.assertIsNone(pages[0]["previous"])
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get("/products/", {"ordering": "price", "cursor": ""}).data
+        second = self.client.get(first["next"]).data
+        back = self.client.get(second["previous"]).data
+        self.assertEqual([r["id"] for r in back["results"]], [r["id"] for r in first["results"]])
+        self.assertIsNone(back["previous"])
+
+    def test_deep_pages_cost_the_same(self):
+        _, pages = self.walk("/products/", {"ordering": "price"})
+        with CaptureQueriesContext(connection) as second:
+            self.client.get(pages[0]["next"])
+        with CaptureQueriesContext(connection) as last:
+            self.client.get(pages[1]["next"])
+        self.assertEqual(len(second.captured_queries), len(last.captured_queries))
+        self.assertFalse(any("COUNT" in q["sql"] for q in last.captured_queries))
+
+    def test_page_number_mode_is_unchanged(self):
+        response = self.client.get("/products/", {"page": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/products/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_order_history_is_paginated(self):
+        user = User.objects.create_user(username="buyer")
+        for _ in range(12):
+            Order.objects.create(user=user, total=10)
+        self.client.force_authenticate(user=user)
+        ids, pages = self.walk("/orders/", {})
+        self.assertEqual(ids, list(Order.objects.order_by("-created_at", "-id").values_list("id", flat=True)))
+        self.assertEqual(len(pages), 2)
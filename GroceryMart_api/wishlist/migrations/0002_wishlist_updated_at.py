@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wishlist", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wishlist",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,10 +1,28 @@
 from django.db import models
 from django.contrib.auth.models import User
+from cart.models import fresh_copy
 from product.models import Product
 
+class WishlistQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        The user's wishlist, created on first use. Runs no query when the authentication
+        loaded it with the user, see GroceryMart_api/authentication.py.
+        """
+        try:
+            wishlist = user.wishlist
+        except Wishlist.DoesNotExist:
+            wishlist, _ = self.get_or_create(user=user)
+            user.wishlist = wishlist
+        return fresh_copy(wishlist, user=user)
+
+
 class Wishlist(models.Model):
     """User wishlist model."""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="wishlist")
+    updated_at = models.DateTimeField(auto_now=True)  # touched whenever an item changes, see wishlist/signals.py
+
+    objects = WishlistQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.user.username}'s Wishlist"
@@ -1,12 +1,15 @@
 from rest_framework import serializers
 from .models import Wishlist, WishlistItem
-from product.serializers import ProductSerializer
+from product.serializers import ProductCardSerializer, ProductSerializer
+from cart.bulk import MAX_OPERATIONS
 from product.models import Product
+from GroceryMart_api.serializers import DynamicFieldsMixin
 
 
-class WishlistItemSerializer(serializers.ModelSerializer):
-    """Serializer for wishlist items."""
-    product = ProductSerializer(read_only=True)
+class WishlistItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer for wishlist items, the product is a card unless ?expand=product."""
+    product = ProductCardSerializer(read_only=True)
+    expandable_fields = {"product": (ProductSerializer, {"read_only": True})}
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source="product", write_only=True
     )
@@ -16,7 +19,7 @@ class WishlistItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product", "product_id"]
 
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for the entire wishlist."""
     items = WishlistItemSerializer(many=True, read_only=True)
 
@@ -24,3 +27,9 @@ class WishlistSerializer(serializers.ModelSerializer):
         model = Wishlist
         fields = ["id", "user", "items"]
         read_only_fields = ["user"]
+
+
+class WishlistMoveToCartSerializer(serializers.Serializer):
+    """Wishlist products to move to the cart, all of them when product_ids is left out."""
+    product_ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=MAX_OPERATIONS)
+    quantity = serializers.IntegerField(min_value=1, default=1)
@@ -0,0 +1,19 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Wishlist, WishlistItem
+
+
+@receiver(post_save, sender=WishlistItem)
+@receiver(post_delete, sender=WishlistItem)
+def touch_wishlist(sender, instance, origin=None, **kwargs):
+    """Moves the wishlist's modification stamp, which the wishlist ETag is built from."""
+    if isinstance(origin, QuerySet):
+        # a queryset delete sends one signal per item, touch each wishlist only once
+        touched = origin.__dict__.setdefault("_touched_wishlists", set())
+        if instance.wishlist_id in touched:
+            return
+        touched.add(instance.wishlist_id)
+    Wishlist.objects.filter(pk=instance.wishlist_id).update(updated_at=timezone.now())
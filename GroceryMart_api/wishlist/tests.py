@@ -1,3 +1,61 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from cart.models import Cart, CartItem
+from product.models import Brand, Product
+from .models import Wishlist, WishlistItem
+
+
+class WishlistTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        brand = Brand.objects.create(name="Test Brand")
+        self.products = [
+            Product.objects.create(name=f"Product {i}", price=2, stock=5, brand=brand) for i in range(30)
+        ]
+        self.wishlist = Wishlist.objects.create(user=self.user)
+        Cart.objects.create(user=self.user)
+        WishlistItem.objects.bulk_create([WishlistItem(wishlist=self.wishlist, product=p) for p in self.products])
+
+    def test_list_is_paginated_and_constant_in_queries(self):
+        response = self.client.get("/wishlist/")
+        self.assertEqual((response.data["count"], len(response.data["results"])), (30, 10))  # PAGE_SIZE
+
+        with self.assertNumQueries(4):  # conditional stamp, count, items, products
+            response = self.client.get("/wishlist/", {"page": 1, "page_size": 20})
+        self.assertEqual(response.data["count"], 30)
+        self.assertEqual([row["product"]["id"] for row in response.data["results"]][:2],
+                         [self.products[-1].id, self.products[-2].id])  # newest first
+        self.assertEqual(len(self.client.get(response.data["next"]).data["results"]), 10)
+
+    def test_move_to_cart_moves_what_is_in_stock(self):
+        milk, bread, egg = self.products[:3]
+        Product.objects.filter(pk=bread.pk).update(stock=0)
+        with self.assertNumQueries(13):
+            response = self.client.post(
+                "/wishlist/move-to-cart/", {"product_ids": [milk.id, bread.id, 999999]}, format="json"
+            )
+        self.assertEqual([r["status"] for r in response.data["results"]], ["ok", "error", "error"])
+        self.assertEqual(response.data["results"][2]["error"], "Item not in wishlist")
+        self.assertEqual(list(CartItem.objects.values_list("product_id", "quantity")), [(milk.id, 1)])
+        self.assertFalse(WishlistItem.objects.filter(product=milk).exists())
+        self.assertTrue(WishlistItem.objects.filter(product=bread).exists())
+
+        # without product_ids everything in stock moves, with the same number of queries
+        with self.assertNumQueries(13):
+            response = self.client.post("/wishlist/move-to-cart/", {}, format="json")
+        self.assertEqual(len(response.data["results"]), 29)
+        self.assertEqual(list(WishlistItem.objects.values_list("product_id", flat=True)), [bread.id])
+        self.assertEqual(CartItem.objects.count(), 29)
 
-# Create your tests here.
+    def test_move_to_cart_without_product_ids_is_capped(self):
+        with patch("wishlist.views.MAX_OPERATIONS", 20):
+            response = self.client.post("/wishlist/move-to-cart/", {}, format="json")
+        self.assertEqual([r["product_id"] for r in response.data["results"]], [p.id for p in self.products[:20]])
+        self.assertEqual(CartItem.objects.count(), 20)
+        self.assertEqual(WishlistItem.objects.count(), 10)  # moved by the next call
@@ -8,4 +8,5 @@ urlpatterns = [
     path('', WishlistViewSet.as_view({'get' : 'list'}), name='wishlist-list'),
     path('add/', WishlistViewSet.as_view({'post' : 'add_item'})),
     path('remove/', WishlistViewSet.as_view({'post' : 'remove_item'})),
+    path('move-to-cart/', WishlistViewSet.as_view({'post' : 'move_to_cart'})),
 ]
@@ -4,23 +4,57 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .models import Wishlist, WishlistItem
-from .serializers import WishlistItemSerializer, WishlistSerializer
+from .serializers import WishlistItemSerializer, WishlistMoveToCartSerializer
+from cart.bulk import MAX_OPERATIONS, apply_operations
+from cart.models import Cart
+from product.models import Product
+from django.db import transaction
+from django.db.models import Max, Prefetch
+from GroceryMart_api.conditional import ConditionalGetMixin, latest
+from GroceryMart_api.pagination import KeysetPagination
+from GroceryMart_api.serializers import expanded_fields
+from product.cache import catalog_version
 
 from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResponse
 
+class WishlistPagination(KeysetPagination):
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
 @extend_schema_view(
     list=extend_schema(
-        summary="Retrieve the current user's wishlist", 
+        summary="Retrieve the current user's wishlist",
+        description="A page of the wishlist's items, newest first: count, next, previous and results, or next/previous cursors with ?cursor=.",
+        responses={200: WishlistItemSerializer(many=True)},
         tags=['Wishlist']),
-        responses={200: WishlistSerializer(many=False)}
 )
-class WishlistViewSet(viewsets.ViewSet):
+class WishlistViewSet(ConditionalGetMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = WishlistPagination
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        # the wishlist's own stamp plus its newest product change, in one query
+        row = Wishlist.objects.filter(user=request.user).annotate(
+            products_updated_at=Max("items__product__updated_at")
+        ).values_list("id", "updated_at", "products_updated_at").first()
+        if row is None:
+            return None  # no wishlist yet, list() creates it
+        # expanded products also carry brand, category and reviews
+        version = catalog_version() if "product" in expanded_fields(request) else None
+        return (row, version), latest(*row[1:])
 
     def list(self, request):
-        wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
-        serializer = WishlistSerializer(instance=wishlist)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        wishlist = Wishlist.objects.for_user(request.user)
+        # products as cards by default, full details only with ?expand=product
+        products = Product.objects.with_details() if "product" in expanded_fields(request) else Product.objects.all()
+
+        # pages of items, newest first, like the order history
+        paginator = self.pagination_class()
+        items = WishlistItem.objects.filter(wishlist=wishlist).prefetch_related(Prefetch("product", queryset=products))
+        page = paginator.paginate_queryset(items.order_by("-id"), request, view=self)
+        serializer = WishlistItemSerializer(page, many=True, context={"request": request})
+        return paginator.get_paginated_response(serializer.data)
 
     @extend_schema(
         summary="Add item to wishlist",
@@ -30,7 +64,7 @@ class WishlistViewSet(viewsets.ViewSet):
     )
     @action(methods=["post"], detail=False)
     def add_item(self, request):
-        wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
+        wishlist = Wishlist.objects.for_user(request.user)
         serializer = WishlistItemSerializer(data=request.data)
 
         if serializer.is_valid():
@@ -57,7 +91,7 @@ class WishlistViewSet(viewsets.ViewSet):
     )
     @action(detail=False, methods=["post"])
     def remove_item(self, request):
-        wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
+        wishlist = Wishlist.objects.for_user(request.user)
         product_id = request.data.get("product_id")
 
         try:
@@ -72,3 +106,54 @@ class WishlistViewSet(viewsets.ViewSet):
                 {"message": "Item not found in wishlist."},
                 status=status.HTTP_404_NOT_FOUND,
             )
+
+    @extend_schema(
+        summary="Move wishlist items to the cart",
+        description=(
+            "Adds the selected wishlist products ( without product_ids the wishlist's first 200, by product id ) "
+            "to the cart, `quantity` units each, and removes the ones that were added from the wishlist. Stock is "
+            "validated for all of them with one product query, products short of stock stay in the wishlist."
+        ),
+        request=WishlistMoveToCartSerializer,
+        responses={
+            200: OpenApiResponse(description="Per-product results: product_id, status (ok/error), quantity in the cart and error"),
+            400: OpenApiResponse(description="Malformed request"),
+        },
+        tags=['Wishlist']
+    )
+    @action(detail=False, methods=["post"])
+    def move_to_cart(self, request):
+        serializer = WishlistMoveToCartSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        requested = serializer.validated_data.get("product_ids")
+        quantity = serializer.validated_data["quantity"]
+
+        with transaction.atomic():
+            wishlist = Wishlist.objects.for_user(request.user)
+            items = WishlistItem.objects.filter(wishlist=wishlist)
+            if requested is not None:
+                items = items.filter(product_id__in=requested)
+            else:
+                # as many as one /cart/bulk/ call takes, the rest move with the next call
+                items = items.order_by("product_id")[:MAX_OPERATIONS]
+            in_wishlist = set(items.values_list("product_id", flat=True))
+            product_ids = list(dict.fromkeys(requested)) if requested is not None else sorted(in_wishlist)
+
+            results = apply_operations(
+                Cart.objects.for_user(request.user),
+                [{"product_id": product_id, "op": "add", "quantity": quantity} for product_id in product_ids if product_id in in_wishlist],
+            )
+            moved = [result["product_id"] for result in results if result["status"] == "ok"]
+            if moved:
+                WishlistItem.objects.filter(wishlist=wishlist, product_id__in=moved).delete()
+
+        results = {result["product_id"]: result for result in results}
+        return Response({
+            "results": [
+                results.get(product_id) or {
+                    "product_id": product_id, "op": "add", "status": "error", "quantity": None, "error": "Item not in wishlist",
+                }
+                for product_id in product_ids
+            ]
+        }, status=status.HTTP_200_OK)